@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+
+def image_seeds(seed: int, num_images: int) -> list[int]:
+    """Seeds of the images of one request: seed + i for the i-th image, batched or not."""
+    return [seed + i for i in range(num_images)]
+
+
+def expand_items(items: list[dict]) -> list[tuple[dict, int]]:
+    """Expands requests with "seed" and "num_images" into one (item, seed) entry per image."""
+    return [(item, seed) for item in items for seed in image_seeds(item["seed"], item["num_images"])]
+
+
+def split_results(items: list[dict], images: list) -> list[list]:
+    """Splits the per-image results of expand_items(items) back into one list per request."""
+    results = []
+    for item in items:
+        results.append(images[: item["num_images"]])
+        images = images[item["num_images"] :]
+    return results
+
+
+class BatchSchedulerClosed(RuntimeError):
+    """Raised by submit() once the scheduler has been closed; run the request directly instead."""
+
+
+class _Request:
+    __slots__ = ("key", "item", "future", "enqueued_at")
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchScheduler:
+    """Collects requests that arrive within a short window and runs them as one batch.
+
+    Only requests with the same ``key`` are grouped. ``run_batch(key, items)`` must
+    return one result per item, in order. Each future resolves to ``(result, batch_size)``.
+
+    A bound-method ``run_batch`` is held weakly, so the worker thread does not keep its
+    owner alive; call ``close()`` when the owner is dropped to stop the thread. Requests
+    already submitted still run; only new submissions are refused.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int = 4, max_wait_ms: float = 50):
+        if hasattr(run_batch, "__self__"):
+            self._run_batch = weakref.WeakMethod(run_batch)
+        else:
+            self._run_batch = lambda: run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: list[_Request] = []
+        self._cond = threading.Condition()
+        self._worker = None
+        self.closed = False
+
+    def submit(self, key, item) -> Future:
+        request = _Request(key, item)
+        with self._cond:
+            if self.closed:
+                raise BatchSchedulerClosed("BatchScheduler is closed.")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+                self._worker.start()
+            self._pending.append(request)
+            self._cond.notify_all()
+        return request.future
+
+    def close(self) -> None:
+        """Refuses new requests; the worker runs the pending ones without waiting, then exits."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _next_batch(self) -> list[_Request]:
+        with self._cond:
+            while not self._pending and not self.closed:
+                self._cond.wait()
+            if not self._pending:
+                return []
+            first = self._pending[0]
+            deadline = first.enqueued_at + self.max_wait
+            while True:
+                batch = [r for r in self._pending if r.key == first.key][: self.max_batch_size]
+                remaining = deadline - time.monotonic()
+                # Once closed nothing more can arrive, so flush without waiting out the window.
+                if len(batch) >= self.max_batch_size or remaining <= 0 or self.closed:
+                    break
+                self._cond.wait(remaining)
+            for request in batch:
+                self._pending.remove(request)
+            return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            run_batch = self._run_batch()
+            try:
+                if run_batch is None:
+                    raise RuntimeError("The BatchScheduler owner was garbage collected.")
+                results = run_batch(batch[0].key, [r.item for r in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                del run_batch
+                continue
+            for request, result in zip(batch, results):
+                request.future.set_result((result, len(batch)))
+            # Don't keep the owner alive while waiting for the next batch.
+            del run_batch, results
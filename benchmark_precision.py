@@ -0,0 +1,73 @@
+import argparse
+import gc
+import time
+
+import psutil
+import torch
+from PIL import Image
+
+from model import Model
+from precision import get_policy
+from settings import DEFAULT_MODEL_ID
+
+
+def benchmark(policy_name, image, runs, num_steps, image_resolution):
+    policy = get_policy(policy_name)
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+
+    start = time.perf_counter()
+    model = Model(base_model_id=DEFAULT_MODEL_ID, policy=policy)
+    load_time = time.perf_counter() - start
+
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        model.process_canny(
+            image=image,
+            prompt="a product poster",
+            additional_prompt="best quality, extremely detailed",
+            negative_prompt="lowres, worst quality, low quality",
+            num_images=1,
+            image_resolution=image_resolution,
+            num_steps=num_steps,
+            guidance_scale=10,
+            seed=i,
+            low_threshold=100,
+            high_threshold=200,
+        )
+        latencies.append(time.perf_counter() - start)
+
+    result = {
+        "policy": policy.name,
+        "device": policy.device,
+        "load_s": load_time,
+        "first_s": latencies[0],
+        "mean_s": sum(latencies[1:]) / max(1, len(latencies) - 1) if len(latencies) > 1 else latencies[0],
+        "rss_mb": (process.memory_info().rss - rss_before) / 2**20,
+        "model_mb": model.resident_bytes() / 2**20,
+    }
+    if torch.cuda.is_available():
+        result["cuda_peak_mb"] = torch.cuda.max_memory_allocated() / 2**20
+    # Stop the batch scheduler thread; it would otherwise keep the pipeline alive.
+    model.close()
+    del model
+    gc.collect()
+    torch.cuda.empty_cache()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare latency and memory of the precision policies.")
+    parser.add_argument("--policies", nargs="+", default=["fp32", "bf16-cpu"], help="Policies to compare (fp32, bf16-cpu, fp16).")
+    parser.add_argument("--image_path", type=str, default="static/test.png", help="Template image to condition on.")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per policy; the first one is reported separately.")
+    parser.add_argument("--num_steps", type=int, default=5)
+    parser.add_argument("--image_resolution", type=int, default=768)
+    args = parser.parse_args()
+
+    image = Image.open(args.image_path).convert("RGB")
+    for name in args.policies:
+        print(benchmark(name, image, args.runs, args.num_steps, args.image_resolution))
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+import numpy as np
+from controlnet_aux.util import ade_palette
+
+from image_segmentor import colorize
+
+
+def colorize_loop(seg):
+    """The previous implementation: one boolean mask assignment per ADE20K label."""
+    color_seg = np.zeros((seg.shape[0], seg.shape[1], 3), dtype=np.uint8)
+    for label, color in enumerate(ade_palette()):
+        color_seg[seg == label, :] = color
+    return color_seg.astype(np.uint8)
+
+
+def timeit(fn, seg, runs):
+    fn(seg)
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(seg)
+    return (time.perf_counter() - start) / runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the per-label loop and the palette lookup for segmentation colourisation.")
+    parser.add_argument("--resolutions", nargs="+", type=int, default=[512, 768])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for resolution in args.resolutions:
+        seg = rng.integers(0, len(ade_palette()), size=(resolution, resolution), dtype=np.int64)
+        assert np.array_equal(colorize_loop(seg), colorize(seg))
+        loop = timeit(colorize_loop, seg, args.runs)
+        lut = timeit(colorize, seg, args.runs)
+        print({"resolution": resolution, "loop_ms": loop * 1000, "lut_ms": lut * 1000, "speedup": loop / lut})
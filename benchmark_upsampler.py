@@ -0,0 +1,57 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from enhancer.enhancer.upsampler import CPUUpsampler
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def sharpness(image):
+    return cv2.Laplacian(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+
+
+def benchmark(name, upscale, original, small, scale, runs):
+    upscale(small, scale)
+    start = time.perf_counter()
+    for _ in range(runs):
+        output = upscale(small, scale)
+    latency = (time.perf_counter() - start) / runs
+    output = output[: original.shape[0], : original.shape[1]]
+    return {"backend": name, "ms": latency * 1000, "psnr": psnr(original, output), "sharpness": sharpness(output)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CPU background upsamplers against GFPGAN's plain resize.")
+    parser.add_argument("--image_path", type=str, default="static/test.png", help="Reference image; it is downscaled, then upscaled back.")
+    parser.add_argument("--scale", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tile", type=int, default=256)
+    parser.add_argument("--dnn_model", type=str, default=None, help="Optional dnn_superres .pb model, e.g. FSRCNN_x2.pb.")
+    args = parser.parse_args()
+
+    original = cv2.imread(args.image_path)
+    h, w = original.shape[:2]
+    h, w = h - h % args.scale, w - w % args.scale
+    original = original[:h, :w]
+    small = cv2.resize(original, (w // args.scale, h // args.scale), interpolation=cv2.INTER_AREA)
+
+    # What GFPGANer does without a background upsampler.
+    def plain_resize(img, scale):
+        return cv2.resize(img, (img.shape[1] * scale, img.shape[0] * scale), interpolation=cv2.INTER_LANCZOS4)
+
+    backends = {"resize": plain_resize}
+    lanczos = CPUUpsampler("lanczos", scale=args.scale, tile=args.tile)
+    backends["lanczos"] = lambda img, scale: lanczos.enhance(img, scale)[0]
+    if args.dnn_model:
+        dnn = CPUUpsampler("dnn", scale=args.scale, model_path=args.dnn_model, tile=args.tile)
+        if dnn.backend == "dnn":
+            backends["dnn"] = lambda img, scale: dnn.enhance(img, scale)[0]
+
+    for name, upscale in backends.items():
+        print(benchmark(name, upscale, original, small, args.scale, args.runs))
@@ -1,53 +1,135 @@
+import json
 import os
 import torch
+import numpy as np
 from PIL import Image
 from transformers import CLIPProcessor, CLIPModel
 import random
+import re
+from lru import LRUCache
+from model_manager import FOOTPRINTS, model_manager
+from settings import CLIP_BATCH_SIZE, CLIP_CACHE_DIR, TEXT_EMBEDDING_CACHE_SIZE, TOPK_CACHE_SIZE
 class ImageTextMatcher:
-    def __init__(self, model_name="openai/clip-vit-base-patch16"):
-        # Load the CLIP model and processor
-        self.model = CLIPModel.from_pretrained(model_name)
+    def __init__(self, model_name="openai/clip-vit-base-patch16", cache_dir=CLIP_CACHE_DIR):
+        # Load the CLIP processor; the model itself is loaded on first use
+        self.model_name = model_name
         self.processor = CLIPProcessor.from_pretrained(model_name)
+        self.cache_dir = cache_dir
         self.image_embeddings = None
         self.image_files = []
+        self.text_embedding_cache = LRUCache(maxsize=TEXT_EMBEDDING_CACHE_SIZE)
+        self.topk_cache = LRUCache(maxsize=TOPK_CACHE_SIZE)
+
+    @property
+    def model(self):
+        # Held by the model manager, which may evict it; only needed for new text or templates.
+        return model_manager.get('clip:' + self.model_name, lambda: CLIPModel.from_pretrained(self.model_name),
+                                 footprint=FOOTPRINTS['clip'])
+
+    @staticmethod
+    def normalize_text(text):
+        """Strips prompt punctuation, collapses whitespace and lower-cases, as the CLIP tokenizer would."""
+        text=text.replace('-','').replace('{','').replace('}','').replace("'",'').replace(':','').replace('[','').replace(']','')
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    def cache_stats(self):
+        return {'text_embeddings': self.text_embedding_cache.stats(), 'topk': self.topk_cache.stats()}
+
+    def _embed_images(self, paths, batch_size=CLIP_BATCH_SIZE):
+        """Creates CLIP image embeddings for the given files, batch_size images per forward pass."""
+        embeddings = []
+        for start in range(0, len(paths), batch_size):
+            images = [Image.open(path).convert("RGB") for path in paths[start:start + batch_size]]
+            inputs = self.processor(images=images, return_tensors="pt")
+            with torch.no_grad():
+                embeddings.append(self.model.get_image_features(**inputs).numpy().astype(np.float32))
+        return np.concatenate(embeddings) if embeddings else None
+
+    def _read_cache(self):
+        index_path = os.path.join(self.cache_dir, 'index.json')
+        embeddings_path = os.path.join(self.cache_dir, 'embeddings.npy')
+        if not (os.path.isfile(index_path) and os.path.isfile(embeddings_path)):
+            return {}, None
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get('model_name') != self.model_name:
+            return {}, None
+        # Copy-on-write memory map: rows are paged in lazily and the tensor view stays writable.
+        embeddings = np.load(embeddings_path, mmap_mode='c')
+        if len(embeddings) != len(index['entries']):
+            return {}, None
+        return {entry['file']: (i, entry) for i, entry in enumerate(index['entries'])}, embeddings
+
+    def _write_cache(self, entries, embeddings):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        embeddings_path = os.path.join(self.cache_dir, 'embeddings.npy')
+        index_path = os.path.join(self.cache_dir, 'index.json')
+        np.save(embeddings_path + '.tmp.npy', embeddings)
+        os.replace(embeddings_path + '.tmp.npy', embeddings_path)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump({'model_name': self.model_name, 'entries': entries}, f)
+        os.replace(index_path + '.tmp', index_path)
 
     def load_images_and_create_embeddings(self, image_folder='templates'):
-        """Loads images from a folder and creates embeddings."""
-        self.image_files = []
-        image_embeddings = []
-        
-        for file in os.listdir(image_folder):
+        """
+        Loads template embeddings from the on-disk cache, embedding only templates that were
+        added or changed since the cache was written and dropping deleted ones.
+        """
+        cached, cached_embeddings = self._read_cache()
+        entries = []
+        for file in sorted(os.listdir(image_folder)):
             if file.endswith(('.png', '.jpg', '.jpeg')):
-                img_path = os.path.join(image_folder, file)
-                image = Image.open(img_path).convert("RGB")
-                self.image_files.append(file)
+                stat = os.stat(os.path.join(image_folder, file))
+                entries.append({'file': file, 'size': stat.st_size, 'mtime': stat.st_mtime_ns})
 
-                # Process the image and create embeddings
-                inputs = self.processor(images=image, return_tensors="pt")
-                with torch.no_grad():
-                    embeddings = self.model.get_image_features(**inputs)
-                image_embeddings.append(embeddings)
-        
-        # Convert list of tensors to a single tensor
-        self.image_embeddings = torch.stack(image_embeddings).squeeze()
+        stale = [
+            entry for entry in entries
+            if entry['file'] not in cached
+            or cached[entry['file']][1]['size'] != entry['size']
+            or cached[entry['file']][1]['mtime'] != entry['mtime']
+        ]
+        unchanged = len(stale) == 0 and len(entries) == len(cached)
+        if unchanged:
+            embeddings = cached_embeddings
+        else:
+            print(f"Embedding {len(stale)} new or changed templates")
+            fresh = self._embed_images([os.path.join(image_folder, entry['file']) for entry in stale])
+            fresh_rows = {entry['file']: i for i, entry in enumerate(stale)}
+            embeddings = np.stack([
+                fresh[fresh_rows[entry['file']]] if entry['file'] in fresh_rows else cached_embeddings[cached[entry['file']][0]]
+                for entry in entries
+            ]) if entries else np.zeros((0, 0), dtype=np.float32)
+            self._write_cache(entries, embeddings)
+
+        self.image_files = [entry['file'] for entry in entries]
+        self.image_embeddings = torch.from_numpy(embeddings)
+        # Cached rankings index into the old template list.
+        self.topk_cache.clear()
         return self.image_files
 
-    def fetch_images_based_on_text(self, text, top_n=6):
-        """Fetches images based on text input."""
+    def fetch_images_based_on_text(self, text, top_n=6, rng=None):
+        """Fetches images based on text input. Pass a seeded random.Random as rng for a repeatable pick."""
         if self.image_embeddings is None or not self.image_files:
             raise ValueError("Image embeddings not created. Please load images first.")
-        text=text.replace('-','').replace('{','').replace('}','').replace("'",'').replace(':','').replace('[','').replace(']','')
-        # Process the text input to create its embedding
+        text = self.normalize_text(text)
         print(text)
-        inputs = self.processor(text=[text], return_tensors="pt", padding=True)
-        with torch.no_grad():
-            text_embedding = self.model.get_text_features(**inputs)
-        # Calculate cosine similarity between text and image embeddings
-        similarities = torch.nn.functional.cosine_similarity(text_embedding, self.image_embeddings)
-        # Get top N matches
-        top_indices = similarities.topk(top_n).indices
-        # Retrieve matching images
-        matched_images = [self.image_files[i] for i in top_indices]
-        random.shuffle(matched_images)
+        matched_images = self.topk_cache.get((text, top_n))
+        if matched_images is None:
+            text_embedding = self.text_embedding_cache.get(text)
+            if text_embedding is None:
+                # Process the text input to create its embedding
+                inputs = self.processor(text=[text], return_tensors="pt", padding=True)
+                with torch.no_grad():
+                    text_embedding = self.model.get_text_features(**inputs)
+                self.text_embedding_cache.put(text, text_embedding)
+            # Calculate cosine similarity between text and image embeddings
+            similarities = torch.nn.functional.cosine_similarity(text_embedding, self.image_embeddings)
+            # Get top N matches
+            top_indices = similarities.topk(top_n).indices
+            # Retrieve matching images
+            matched_images = [self.image_files[i] for i in top_indices]
+            self.topk_cache.put((text, top_n), matched_images)
+        matched_images = list(matched_images)
+        (rng or random).shuffle(matched_images)
         print(matched_images)
-        return 'templates/'+matched_images[0]
\ No newline at end of file
+        return 'templates/'+matched_images[0]
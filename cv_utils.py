@@ -16,6 +16,16 @@ def resize_image(input_image, resolution, interpolation=None):
     img = cv2.resize(input_image, (W, H), interpolation=interpolation)
     return img
 
+
+def batches_by_shape(images, batch_size):
+    """Groups the indices of equally shaped arrays into batches of at most batch_size."""
+    groups = {}
+    for i, image in enumerate(images):
+        groups.setdefault(image.shape, []).append(i)
+    for indices in groups.values():
+        for start in range(0, len(indices), batch_size):
+            yield indices[start:start + batch_size]
+
 from PIL import Image, ImageDraw, ImageFont
 
 from PIL import Image, ImageDraw, ImageFont
@@ -3,23 +3,29 @@ import PIL.Image
 from controlnet_aux.util import HWC3
 from transformers import pipeline
 
-from cv_utils import resize_image
+from cv_utils import batches_by_shape, resize_image
 
 
 class DepthEstimator:
     def __init__(self):
         self.model = pipeline("depth-estimation")
 
-    def __call__(self, image: np.ndarray, **kwargs) -> PIL.Image.Image:
+    def __call__(self, image, **kwargs):
+        """
+        Estimates depth for one image or a list of images. A list is resized up front and
+        run through the pipeline in batches of equally sized images; a list of results is
+        returned for a list input.
+        """
         detect_resolution = kwargs.pop("detect_resolution", 512)
         image_resolution = kwargs.pop("image_resolution", 512)
-        image = np.array(image)
-        image = HWC3(image)
-        image = resize_image(image, resolution=detect_resolution)
-        image = PIL.Image.fromarray(image)
-        image = self.model(image)
-        image = image["depth"]
-        image = np.array(image)
-        image = HWC3(image)
-        image = resize_image(image, resolution=image_resolution)
-        return PIL.Image.fromarray(image)
+        batch_size = kwargs.pop("batch_size", 8)
+        images = image if isinstance(image, list) else [image]
+        inputs = [resize_image(HWC3(np.asarray(img)), resolution=detect_resolution) for img in images]
+
+        results = [None] * len(inputs)
+        for indices in batches_by_shape(inputs, batch_size):
+            outputs = self.model([PIL.Image.fromarray(inputs[i]) for i in indices], batch_size=len(indices))
+            for i, output in zip(indices, outputs):
+                depth = HWC3(np.asarray(output["depth"]))
+                results[i] = PIL.Image.fromarray(resize_image(depth, resolution=image_resolution))
+        return results if isinstance(image, list) else results[0]
@@ -1,20 +1,29 @@
 import os
+import threading
+import time
 import torch 
 from gfpgan import GFPGANer
 from tqdm import tqdm
 import cv2
 
+from .upsampler import CPUUpsampler
+
 
 class Enhancer:
-    def __init__(self, method='gfpgan', background_enhancement=True, upscale=2):
+    def __init__(self, method='gfpgan', background_enhancement=True, upscale=2, cpu_upsampler='lanczos',
+                 cpu_upsampler_model=None, face_precheck=True, face_check_size=640):
+        self.upscale = upscale
+        self.face_precheck = face_precheck
+        self.face_check_size = face_check_size
+        self.face_detector = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'))
+        self._lock = threading.Lock()  # guards the cascade and the GFPGAN timing counters
+        self.gfpgan_runs = 0
+        self.gfpgan_seconds = 0.0
         # Set up RealESRGAN for background enhancement
         if background_enhancement:
             if upscale == 2:
                 if not torch.cuda.is_available(): # CPU
-                    import warnings
-                    warnings.warn('The unoptimized RealESRGAN is slow on CPU. We do not use it. '
-                                'If you really want to use it, please modify the corresponding codes.')
-                    self.bg_upsampler = None
+                    self.bg_upsampler = self._cpu_upsampler(cpu_upsampler, upscale, cpu_upsampler_model)
                 else:
                     from basicsr.archs.rrdbnet_arch import RRDBNet
                     from realesrgan import RealESRGANer
@@ -29,10 +38,7 @@ class Enhancer:
                         half=True)  # need to set False in CPU mode
             elif upscale == 4:
                 if not torch.cuda.is_available(): # CPU
-                    import warnings
-                    warnings.warn('The unoptimized RealESRGAN is slow on CPU. We do not use it. '
-                                'If you really want to use it, please modify the corresponding codes.')
-                    self.bg_upsampler = None
+                    self.bg_upsampler = self._cpu_upsampler(cpu_upsampler, upscale, cpu_upsampler_model)
                 else:
                     from basicsr.archs.rrdbnet_arch import RRDBNet
                     from realesrgan import RealESRGANer
@@ -87,6 +93,16 @@ class Enhancer:
             bg_upsampler=self.bg_upsampler)
         
 
+    @staticmethod
+    def _cpu_upsampler(backend, scale, model_path):
+        """Returns the CPU background upsampler for backend, or None for GFPGAN's plain resize."""
+        if backend in (None, 'none'):
+            import warnings
+            warnings.warn('The unoptimized RealESRGAN is slow on CPU. We do not use it. '
+                        'Set CPU_UPSAMPLER to lanczos or dnn for a CPU background upsampler.')
+            return None
+        return CPUUpsampler(backend=backend, scale=scale, model_path=model_path)
+
     def check_image_dimensions(self, image):
         # Get the dimensions of the image
         height, width, _ = image.shape
@@ -101,17 +117,71 @@ class Enhancer:
             return True
         
 
-    def enhance(self, image):
+    def has_faces(self, img):
+        """
+        Cheap first pass before GFPGAN: a Haar cascade on a copy downscaled so its longer
+        side is at most face_check_size. Returns the number of faces found.
+        """
+        h, w = img.shape[:2]
+        scale = min(1.0, self.face_check_size / max(h, w))
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        with self._lock:
+            faces = self.face_detector.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        return len(faces)
+
+    def upscale_background(self, img):
+        """What GFPGAN does to the background: the bg upsampler, or a plain Lanczos resize."""
+        if self.bg_upsampler is not None:
+            return self.bg_upsampler.enhance(img, outscale=self.upscale)[0]
+        h, w = img.shape[:2]
+        return cv2.resize(img, (w * self.upscale, h * self.upscale), interpolation=cv2.INTER_LANCZOS4)
+
+    def enhance(self, image, info=None):
+        """
+        Restores faces and upscales the background of an RGB image. With the face pre-check
+        on, images without faces skip GFPGAN and only get the background upscale, at the
+        same output size. info, if given, receives the decision and timings.
+        """
         img = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        details = {}
         if self.check_image_dimensions(img):
-            cropped_faces, restored_faces, r_img = self.restorer.enhance(
-                img,
-                has_aligned=False,
-                only_center_face=False,
-                paste_back=True)
+            faces = None
+            if self.face_precheck:
+                start = time.perf_counter()
+                faces = self.has_faces(img)
+                details['face_check_seconds'] = time.perf_counter() - start
+                details['faces'] = faces
+            start = time.perf_counter()
+            if faces == 0:
+                r_img = self.upscale_background(img)
+                details['gfpgan'] = 'skipped'
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    mean_gfpgan = self.gfpgan_seconds / self.gfpgan_runs if self.gfpgan_runs else None
+                if mean_gfpgan is not None:
+                    # Estimated from the mean of the runs that did go through GFPGAN.
+                    details['saved_seconds'] = mean_gfpgan - elapsed - details['face_check_seconds']
+            else:
+                cropped_faces, restored_faces, r_img = self.restorer.enhance(
+                    img,
+                    has_aligned=False,
+                    only_center_face=False,
+                    paste_back=True)
+                details['gfpgan'] = 'ran'
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.gfpgan_runs += 1
+                    self.gfpgan_seconds += elapsed
+            details['enhance_seconds'] = elapsed
+            print(f"Enhance: {details}")
         else:
             r_img = img
-        
+            details['gfpgan'] = 'too large'
+
+        if info is not None:
+            info.update(details)
         r_img = cv2.cvtColor(r_img, cv2.COLOR_BGR2RGB)
 
         return r_img
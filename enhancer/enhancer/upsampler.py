@@ -0,0 +1,85 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+class CPUUpsampler:
+    """
+    Background upsampler for GFPGANer on CPU-only hosts, where RealESRGAN is too slow.
+
+    The image is cut into tiles with a small overlap, each tile is upscaled on a thread
+    pool and the centres are stitched back together. Backends:
+
+    - 'lanczos': Lanczos resampling followed by an unsharp mask.
+    - 'dnn': an OpenCV dnn_superres model (EDSR, ESPCN, FSRCNN or LapSRN .pb file). This
+      needs opencv-contrib; without it the upsampler falls back to 'lanczos'.
+
+    Implements the enhance(img, outscale) interface GFPGANer expects from RealESRGANer.
+    """
+
+    def __init__(self, backend='lanczos', scale=2, model_path=None, tile=256, tile_pad=8, workers=None,
+                 sharpen_amount=0.6, sharpen_sigma=1.0):
+        self.scale = scale
+        self.tile = tile
+        self.tile_pad = tile_pad
+        self.sharpen_amount = sharpen_amount
+        self.sharpen_sigma = sharpen_sigma
+        self.backend = backend
+        self.model_path = model_path
+        if backend == 'dnn':
+            if not hasattr(cv2, 'dnn_superres') or not model_path or not os.path.isfile(model_path):
+                print(f"OpenCV dnn_superres or the model {model_path} is not available; using lanczos.")
+                self.backend = 'lanczos'
+        elif backend != 'lanczos':
+            raise ValueError(f'Unknown CPU upsampler backend {backend}.')
+        self._local = threading.local()
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix='upsample')
+
+    def _dnn(self):
+        # DnnSuperResImpl is not thread-safe, so each worker thread gets its own.
+        sr = getattr(self._local, 'sr', None)
+        if sr is None:
+            name = os.path.basename(self.model_path).split('_')[0].lower()
+            sr = cv2.dnn_superres.DnnSuperResImpl_create()
+            sr.readModel(self.model_path)
+            sr.setModel(name, self.scale)
+            self._local.sr = sr
+        return sr
+
+    def upscale_tile(self, tile, scale):
+        if self.backend == 'dnn' and scale == self.scale:
+            return self._dnn().upsample(tile)
+        h, w = tile.shape[:2]
+        up = cv2.resize(tile, (w * scale, h * scale), interpolation=cv2.INTER_LANCZOS4)
+        if self.sharpen_amount:
+            blurred = cv2.GaussianBlur(up, (0, 0), self.sharpen_sigma)
+            up = cv2.addWeighted(up, 1 + self.sharpen_amount, blurred, -self.sharpen_amount, 0)
+        return up
+
+    def enhance(self, img, outscale=None):
+        """Returns (upscaled image, None), like RealESRGANer.enhance."""
+        outscale = outscale or self.scale
+        scale = int(outscale)
+        h, w = img.shape[:2]
+        if scale != outscale:
+            return cv2.resize(img, (int(w * outscale), int(h * outscale)), interpolation=cv2.INTER_LANCZOS4), None
+        out = np.empty((h * scale, w * scale) + img.shape[2:], dtype=img.dtype)
+        pad = self.tile_pad
+
+        def run(y0, x0):
+            y1, x1 = min(y0 + self.tile, h), min(x0 + self.tile, w)
+            py0, px0 = max(0, y0 - pad), max(0, x0 - pad)
+            py1, px1 = min(h, y1 + pad), min(w, x1 + pad)
+            up = self.upscale_tile(img[py0:py1, px0:px1], scale)
+            # Keep only the tile's own area; the overlap hides seams from the filters.
+            out[y0 * scale:y1 * scale, x0 * scale:x1 * scale] = up[
+                (y0 - py0) * scale:(y1 - py0) * scale, (x0 - px0) * scale:(x1 - px0) * scale
+            ]
+
+        futures = [self.pool.submit(run, y, x) for y in range(0, h, self.tile) for x in range(0, w, self.tile)]
+        for future in futures:
+            future.result()
+        return out, None
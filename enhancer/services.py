@@ -6,11 +6,17 @@ import uuid
 import numpy as np
 import base64
 from enhancer.enhancer.enhancer import Enhancer
+from model_manager import FOOTPRINTS, default_device, model_manager
 
 
 TEMP_PATH = 'temp'
 ENHANCE_METHOD = os.getenv('METHOD')
 BACKGROUND_ENHANCEMENT = os.getenv('BACKGROUND_ENHANCEMENT')
+# Background upsampler on CPU-only hosts: 'lanczos', 'dnn' (with CPU_UPSAMPLER_MODEL) or 'none'.
+CPU_UPSAMPLER = os.getenv('CPU_UPSAMPLER', 'lanczos')
+CPU_UPSAMPLER_MODEL = os.getenv('CPU_UPSAMPLER_MODEL')
+# Skip GFPGAN when a quick Haar cascade pass finds no faces.
+FACE_PRECHECK = os.getenv('FACE_PRECHECK', 'True') == 'True'
 if ENHANCE_METHOD is None:
     ENHANCE_METHOD = 'gfpgan'
 
@@ -19,12 +25,19 @@ if BACKGROUND_ENHANCEMENT is None:
 else:
     BACKGROUND_ENHANCEMENT = True if BACKGROUND_ENHANCEMENT == 'True' else False
 
-enhancer = Enhancer(background_enhancement=BACKGROUND_ENHANCEMENT, upscale=2)
 
+def get_enhancer():
+    """Returns the process-wide Enhancer, loading GFPGAN on first use."""
+    return model_manager.get('gfpgan',
+                             lambda: Enhancer(background_enhancement=BACKGROUND_ENHANCEMENT, upscale=2,
+                                              cpu_upsampler=CPU_UPSAMPLER, cpu_upsampler_model=CPU_UPSAMPLER_MODEL,
+                                              face_precheck=FACE_PRECHECK),
+                             device=default_device(), footprint=FOOTPRINTS['gfpgan'])
 
-def enhance(image:Image) -> Image:
+
+def enhance(image:Image, info=None) -> Image:
    
-    restored_image = enhancer.enhance(np.array(image))
+    restored_image = get_enhancer().enhance(np.array(image), info=info)
 
     final_image = Image.fromarray(restored_image)
     return final_image
@@ -0,0 +1,74 @@
+import os
+import re
+
+from PIL import ImageFont
+
+from lru import LRUCache
+from settings import DEFAULT_FONT, FONT_DIR
+from text_layout import load_font
+
+
+def normalize_family(name):
+    """'Open Sans', 'open-sans' and 'OpenSans' all map to 'opensans'."""
+    return re.sub(r'[^a-z0-9]', '', (name or '').lower())
+
+
+class FontRegistry:
+    """
+    Scans a font directory once and indexes the fonts by normalised family name and
+    file name. FreeTypeFont instances are cached per (file, size), so rendering does not
+    go back to the filesystem for fonts. Fonts are opened by path: FreeType maps the
+    file itself, so cached sizes of one font share its pages instead of each holding a
+    copy of the file.
+    """
+
+    def __init__(self, font_dir=FONT_DIR, default_font=DEFAULT_FONT, max_fonts=512):
+        self.font_dir = font_dir
+        self.default_font = default_font
+        self.families = {}  # normalised family -> font path
+        self._fonts = LRUCache(maxsize=max_fonts)
+        self.scan()
+
+    def scan(self):
+        families = {}
+        if os.path.isdir(self.font_dir):
+            for root, _, files in os.walk(self.font_dir):
+                for file in sorted(files):
+                    if not file.lower().endswith(('.ttf', '.otf')):
+                        continue
+                    path = os.path.join(root, file)
+                    try:
+                        family, style = ImageFont.truetype(path, 12).getname()
+                    except OSError:
+                        continue
+                    stem = normalize_family(os.path.splitext(file)[0])
+                    families.setdefault(stem, path)
+                    # Prefer the regular face for the bare family name.
+                    key = normalize_family(family)
+                    if key not in families or (style or '').lower() == 'regular':
+                        families[key] = path
+        self.families = families
+        print(f"Indexed {len(families)} font names from {self.font_dir}")
+
+    def resolve(self, family):
+        """Returns the font path for a family name, or None if it is not installed."""
+        return self.families.get(normalize_family(family))
+
+    def get(self, family, size):
+        """Returns a cached FreeTypeFont for the family at the given size, falling back to the default font."""
+        size = max(1, int(size))
+        path = self.resolve(family)
+        if path is None:
+            return load_font(self.default_font, size)
+        font = self._fonts.get((path, size))
+        if font is None:
+            font = ImageFont.truetype(path, size)
+            self._fonts.put((path, size), font)
+        return font
+
+    def loader(self, family):
+        """Returns a size -> FreeTypeFont callable for the text layout code."""
+        return lambda size: self.get(family, size)
+
+
+font_registry = FontRegistry()
@@ -0,0 +1,114 @@
+import io
+import math
+
+from PIL import Image
+
+
+class EncodeResult:
+    def __init__(self, data, image, scale, quality, passes, format):
+        self.data = data  # encoded bytes
+        self.image = image  # the (possibly downscaled) image that was encoded
+        self.scale = scale
+        self.quality = quality
+        self.passes = passes  # number of full encodes it took
+        self.format = format
+
+
+def encode(image, format='JPEG', quality=75, **params):
+    """Encodes an image once and returns the bytes."""
+    buffer = io.BytesIO()
+    save(image, buffer, format=format, quality=quality, **params)
+    return buffer.getvalue()
+
+
+def save(image, fp, format='JPEG', quality=75, **params):
+    """Encodes an image into any writable file-like object, such as an HttpResponse."""
+    format = format.upper()
+    if format in ('JPEG', 'JPG') and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    if format in ('JPEG', 'JPG', 'WEBP'):
+        params['quality'] = quality
+    image.save(fp, format=format, **params)
+
+
+def encode_to_budget(image, max_bytes, format='JPEG', quality=75, min_quality=None, max_passes=8, tolerance=0.9):
+    """
+    Encodes an image so the result is at most max_bytes, in a few passes.
+
+    If min_quality is given, the quality is first binary-searched between min_quality and
+    quality at full size. If that is not enough, the scale is searched: the first guess
+    assumes bytes grow with pixel count, later guesses use the bytes-per-pixel actually
+    observed, and each guess is kept inside the bracket of known good and bad scales.
+    The search stops once a result lands within tolerance of the budget.
+
+    Args:
+        image (Image.Image): The image to encode.
+        max_bytes (int): The byte budget.
+        format (str): 'JPEG' or 'WEBP'.
+        quality (int): Starting (and highest) quality.
+        min_quality (int): Lowest quality to try before downscaling; None keeps quality fixed.
+        max_passes (int): Upper bound on the number of encodes.
+        tolerance (float): A fitting result above tolerance * max_bytes ends the search.
+
+    Returns:
+        EncodeResult: The bytes, the encoded image, the chosen scale and quality, and the pass count.
+    """
+    passes = 0
+
+    def attempt(img, q):
+        nonlocal passes
+        passes += 1
+        return encode(img, format=format, quality=q)
+
+    data = attempt(image, quality)
+    if len(data) <= max_bytes:
+        return EncodeResult(data, image, 1.0, quality, passes, format)
+
+    if min_quality is not None and min_quality < quality:
+        low, high, best = min_quality, quality - 1, None
+        while low <= high and passes < max_passes // 2:
+            q = (low + high) // 2
+            candidate = attempt(image, q)
+            if len(candidate) <= max_bytes:
+                best = (candidate, q)
+                low = q + 1
+            else:
+                high = q - 1
+        if best is not None:
+            return EncodeResult(best[0], image, 1.0, best[1], passes, format)
+        quality = min_quality
+
+    width, height = image.size
+    good, bad = 0.0, 1.0
+    best = None
+    # Bytes scale roughly with pixel count, i.e. with scale squared.
+    scale = min(0.95, math.sqrt(max_bytes / len(data)))
+    while passes < max_passes:
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        resized = image.resize(size, Image.LANCZOS)
+        data = attempt(resized, quality)
+        if len(data) <= max_bytes:
+            good = scale
+            best = EncodeResult(data, resized, scale, quality, passes, format)
+            if len(data) >= max_bytes * tolerance:
+                break
+        else:
+            bad = scale
+        if bad - good < 0.01:
+            break
+        # Aim a little under the budget using the observed bytes per pixel.
+        estimate = scale * math.sqrt(max_bytes * (1 + tolerance) / 2 / len(data))
+        scale = estimate if good < estimate < bad else (good + bad) / 2
+
+    if best is None:
+        # Out of passes without a fit: shrink until it fits, ignoring the pass budget.
+        while True:
+            scale /= 2
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            resized = image.resize(size, Image.LANCZOS)
+            data = attempt(resized, quality)
+            if len(data) <= max_bytes or size == (1, 1):
+                best = EncodeResult(data, resized, scale, quality, passes, format)
+                break
+    best.passes = passes
+    return best
@@ -5,7 +5,17 @@ import torch
 from controlnet_aux.util import HWC3, ade_palette
 from transformers import AutoImageProcessor, UperNetForSemanticSegmentation
 
-from cv_utils import resize_image
+from cv_utils import batches_by_shape, resize_image
+
+
+# Label -> RGB lookup table; labels past the 150 ADE20K classes stay black.
+ADE_PALETTE = np.zeros((256, 3), dtype=np.uint8)
+ADE_PALETTE[: len(ade_palette())] = np.asarray(ade_palette(), dtype=np.uint8)
+
+
+def colorize(seg: np.ndarray) -> np.ndarray:
+    """Maps an H x W label map to an H x W x 3 ADE20K colour image with one table gather."""
+    return ADE_PALETTE[seg]
 
 
 class ImageSegmentor:
@@ -14,20 +24,29 @@ class ImageSegmentor:
         self.image_segmentor = UperNetForSemanticSegmentation.from_pretrained("openmmlab/upernet-convnext-small")
 
     @torch.inference_mode()
-    def __call__(self, image: np.ndarray, **kwargs) -> PIL.Image.Image:
+    def __call__(self, image, **kwargs):
+        """
+        Segments one image or a list of images. A list is resized up front and run through
+        UperNet in batches of equally sized images; a list of results is returned for a
+        list input.
+        """
         detect_resolution = kwargs.pop("detect_resolution", 512)
         image_resolution = kwargs.pop("image_resolution", 512)
-        image = HWC3(image)
-        image = resize_image(image, resolution=detect_resolution)
-        image = PIL.Image.fromarray(image)
-
-        pixel_values = self.image_processor(image, return_tensors="pt").pixel_values
-        outputs = self.image_segmentor(pixel_values)
-        seg = self.image_processor.post_process_semantic_segmentation(outputs, target_sizes=[image.size[::-1]])[0]
-        color_seg = np.zeros((seg.shape[0], seg.shape[1], 3), dtype=np.uint8)
-        for label, color in enumerate(ade_palette()):
-            color_seg[seg == label, :] = color
-        color_seg = color_seg.astype(np.uint8)
-
-        color_seg = resize_image(color_seg, resolution=image_resolution, interpolation=cv2.INTER_NEAREST)
-        return PIL.Image.fromarray(color_seg)
+        batch_size = kwargs.pop("batch_size", 8)
+        images = image if isinstance(image, list) else [image]
+        inputs = [resize_image(HWC3(np.asarray(img)), resolution=detect_resolution) for img in images]
+
+        results = [None] * len(inputs)
+        for indices in batches_by_shape(inputs, batch_size):
+            batch = [inputs[i] for i in indices]
+            pixel_values = self.image_processor(batch, return_tensors="pt").pixel_values
+            outputs = self.image_segmentor(pixel_values)
+            # Upsample the logits straight to the detection resolution.
+            segs = self.image_processor.post_process_semantic_segmentation(
+                outputs, target_sizes=[img.shape[:2] for img in batch]
+            )
+            for i, seg in zip(indices, segs):
+                color_seg = colorize(seg.numpy())
+                color_seg = resize_image(color_seg, resolution=image_resolution, interpolation=cv2.INTER_NEAREST)
+                results[i] = PIL.Image.fromarray(color_seg)
+        return results if isinstance(image, list) else results[0]
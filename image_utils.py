@@ -64,10 +64,19 @@ def paste_image_on_background(base_image:Image, paste_image:Image, bbox)->Image:
 
 from PIL import Image, ImageDraw, ImageFont
 
+from text_layout import layout_text, load_font
+
+def _line_gradient(gradient_start, gradient_end, i, n):
+    r = int(gradient_start[0] + (gradient_end[0] - gradient_start[0]) * (i / n))
+    g = int(gradient_start[1] + (gradient_end[1] - gradient_start[1]) * (i / n))
+    b = int(gradient_start[2] + (gradient_end[2] - gradient_start[2]) * (i / n))
+    return (r, g, b)
+
 def draw_multiline_text_in_bbox(image: Image.Image, text: str, bbox: tuple, 
                                   font_path: str = "arial.ttf", 
                                   gradient_start: tuple = (100, 0, 0), 
-                                  gradient_end: tuple = (0, 0, 100)) -> Image.Image:
+                                  gradient_end: tuple = (0, 0, 100),
+                                  layout=None) -> Image.Image:
     """
     Draws multiline text inside a given bounding box on the provided image with a 3D effect and gradient color.
     Args:
@@ -77,90 +86,30 @@ def draw_multiline_text_in_bbox(image: Image.Image, text: str, bbox: tuple,
         font_path (str): The path to the TTF font file to be used.
         gradient_start (tuple): The RGB color to start the gradient (default red).
         gradient_end (tuple): The RGB color to end the gradient (default blue).
+        layout (TextLayout): A precomputed layout from text_layout.layout_text; computed here if omitted.
     Returns:
         Image.Image: The image with the text drawn inside the bounding box.
     """
-    # Create a drawing context
     draw = ImageDraw.Draw(image)
-    # Extract bounding box coordinates
-    left, upper, right, lower = bbox
-    bbox_width = int((right - left) * 0.9)
-    bbox_height = int((lower - upper) * 0.9)
-    
-    # Set initial font size
-    font_size = bbox_height // 2  # Start with a reasonable size
-
-    # Load font
-    try:
-        font = ImageFont.truetype(font_path, font_size)
-    except IOError:
-        font = ImageFont.load_default(font_size)
-
-    # Reduce font size until the text fits in the bounding box
-    while True:
-        # Split the text into lines that fit within the bounding box width
-        lines = []
-        words = text.split()
-        current_line = ""
-        for word in words:
-            test_line = f"{current_line} {word}".strip()
-            text_bbox = draw.textbbox((left, upper), test_line, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            if text_width <= bbox_width:
-                current_line = test_line
-            else:
-                lines.append(current_line)
-                current_line = word
-        lines.append(current_line)  # Add the last line
-
-        # Calculate total text height
-        total_text_height = sum(draw.textbbox((0, 0), line, font=font)[3] - draw.textbbox((0, 0), line, font=font)[1] for line in lines)
-        if total_text_height <= bbox_height:
-            break
-        font_size -= 1
-        try:
-            font = ImageFont.truetype(font_path, font_size)
-        except IOError:
-            font = ImageFont.load_default(font_size)
-
-    # Calculate starting y position to center the text vertically in the bbox
-    y = upper + (bbox_height - total_text_height) / 2
+    if layout is None:
+        layout = layout_text(text, bbox, font_path=font_path, align="left")
 
     # Draw each line of text with 3D effect and gradient color
-    for i, line in enumerate(lines):
-        # 3D effect: draw shadow first
-        shadow_offset = 0  # Change this for more or less shadow
-        shadow_color = (50, 50, 50)  # Dark gray shadow color
-        shadow_text_bbox = draw.textbbox((left + shadow_offset, y + shadow_offset), line, font=font)
-        shadow_width = shadow_text_bbox[2] - shadow_text_bbox[0]
-        # while(shadow_width<bbox_width):
-        #     font_size+=1
-        #     font = ImageFont.truetype(font_path, font_size)
-        #     shadow_text_bbox = draw.textbbox((left + shadow_offset, y + shadow_offset), line, font=font)
-        #     shadow_width = shadow_text_bbox[2] - shadow_text_bbox[0]
-        shadow_x = left + shadow_offset  # Left align the shadow
-        draw.text((shadow_x, y + shadow_offset), line, font=font, fill=shadow_color)
-
-        # Calculate gradient color for the line
-        r = int(gradient_start[0] + (gradient_end[0] - gradient_start[0]) * (i / len(lines)))
-        g = int(gradient_start[1] + (gradient_end[1] - gradient_start[1]) * (i / len(lines)))
-        b = int(gradient_start[2] + (gradient_end[2] - gradient_start[2]) * (i / len(lines)))
-        gradient_color = (r, g, b)
-
-        # Draw the main text with gradient color
-        text_bbox = draw.textbbox((left, y), line, font=font)
-        x = left  # Left align the text
-        draw.text((x, y), line, font=font, fill=gradient_color)  # Use gradient color
-
-        y += text_bbox[3] - text_bbox[1] + 5  # Move y position down for the next line
+    shadow_offset = 0  # Change this for more or less shadow
+    shadow_color = (50, 50, 50)  # Dark gray shadow color
+    for i, (line, (x, y)) in enumerate(zip(layout.lines, layout.positions)):
+        draw.text((x + shadow_offset, y + shadow_offset), line, font=layout.font, fill=shadow_color)
+        gradient_color = _line_gradient(gradient_start, gradient_end, i, len(layout.lines))
+        draw.text((x, y), line, font=layout.font, fill=gradient_color)  # Use gradient color
 
     return image
 def draw_multiline_text_in_bbox_center(image: Image.Image, text: str, bbox: tuple, 
                                   font_path: str = "arial.ttf", 
                                   gradient_start: tuple = (100, 0, 0), 
-                                  gradient_end: tuple = (0, 0, 100)) -> Image.Image:
+                                  gradient_end: tuple = (0, 0, 100),
+                                  layout=None) -> Image.Image:
     """
-    Draws multiline text inside a given bounding box on the provided image with a 3D effect and gradient color.
+    Draws multiline text centered inside a given bounding box on the provided image with a gradient color.
     Args:
         image (Image.Image): The image to draw on.
         text (str): The text to be drawn, which can contain line breaks.
@@ -168,106 +117,102 @@ def draw_multiline_text_in_bbox_center(image: Image.Image, text: str, bbox: tupl
         font_path (str): The path to the TTF font file to be used.
         gradient_start (tuple): The RGB color to start the gradient (default red).
         gradient_end (tuple): The RGB color to end the gradient (default blue).
+        layout (TextLayout): A precomputed layout from text_layout.layout_text; computed here if omitted.
     Returns:
         Image.Image: The image with the text drawn inside the bounding box.
     """
     draw = ImageDraw.Draw(image)
-    left, upper, right, lower = bbox
-    bbox_width = int((right - left) * 0.9)
-    bbox_height = int((lower - upper) * 0.9)
-    
-    font_size = bbox_height // 2
-
-    try:
-        font = ImageFont.truetype(font_path, font_size)
-    except IOError:
-        font = ImageFont.load_default(font_size)
-
-    while True:
-        lines = []
-        words = text.split()
-        current_line = ""
-        for word in words:
-            test_line = f"{current_line} {word}".strip()
-            text_bbox = draw.textbbox((left, upper), test_line, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            if text_width <= bbox_width:
-                current_line = test_line
-            else:
-                lines.append(current_line)
-                current_line = word
-        lines.append(current_line)
-
-        total_text_height = sum(draw.textbbox((0, 0), line, font=font)[3] - draw.textbbox((0, 0), line, font=font)[1] for line in lines)
-        if total_text_height <= bbox_height:
-            break
-        font_size -= 1
-        try:
-            font = ImageFont.truetype(font_path, font_size)
-        except IOError:
-            font = ImageFont.load_default(font_size)
-
-    y = upper + (bbox_height - total_text_height) / 2
-
-    for i, line in enumerate(lines):
-        shadow_offset = 1  # Change this for more or less shadow
-        shadow_color = (50, 50, 50)
-        shadow_text_bbox = draw.textbbox((left + shadow_offset, y + shadow_offset), line, font=font)
-        
-        shadow_x = left + shadow_offset
-#        draw.text((shadow_x, y + shadow_offset), line, font=font, fill=shadow_color)
-
-        r = int(gradient_start[0] + (gradient_end[0] - gradient_start[0]) * (i / len(lines)))
-        g = int(gradient_start[1] + (gradient_end[1] - gradient_start[1]) * (i / len(lines)))
-        b = int(gradient_start[2] + (gradient_end[2] - gradient_start[2]) * (i / len(lines)))
-        gradient_color = (r, g, b)
-
-        text_bbox = draw.textbbox((left, y), line, font=font)
-        line_width = text_bbox[2] - text_bbox[0]
-        x = left + (bbox_width - line_width) / 2  # Center the line
-        draw.text((x, y), line, font=font, fill=gradient_color)
-
-        y += text_bbox[3] - text_bbox[1] + 5  # Move y position down for the next line
+    if layout is None:
+        layout = layout_text(text, bbox, font_path=font_path, align="center")
+
+    for i, (line, (x, y)) in enumerate(zip(layout.lines, layout.positions)):
+        gradient_color = _line_gradient(gradient_start, gradient_end, i, len(layout.lines))
+        draw.text((x, y), line, font=layout.font, fill=gradient_color)
 
     return image
 import cv2
 import numpy as np
 import easyocr
 from PIL import Image
+from model_manager import FOOTPRINTS, default_device, model_manager
+from settings import OCR_WORKING_SIZE
 
-def remove_text_with_easyocr(pil_image):
+class TextRegionDetector:
     """
-    Detects and removes text from a PIL image using EasyOCR and OpenCV.
-    :param pil_image: Input PIL image.
-    :return: Processed PIL image with text removed.
+    Long-lived EasyOCR text detector. Only the CRAFT detection network is loaded;
+    recognition is never run because only the text polygons are used.
     """
-    # Initialize EasyOCR Reader
-    reader = easyocr.Reader(['en'])
-
-    # Convert PIL image to NumPy array and then to BGR format
-    img = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-
-    # Perform OCR to detect text
-    results = reader.readtext(img)
 
-    # Create a mask for the detected text
-    mask = np.zeros(img.shape[:2], dtype=np.uint8)
-
-    for (bbox, text, prob) in results:
-        # Get the bounding box coordinates
-        pts = np.array(bbox, dtype=np.int32)
-        cv2.fillConvexPoly(mask, pts, 255)  # Fill the detected text area
+    def __init__(self, languages=('en',), working_size=OCR_WORKING_SIZE):
+        self.reader = easyocr.Reader(list(languages), recognizer=False)
+        self.working_size = working_size
+
+    def detect(self, images):
+        """
+        Detects text regions in one or more images (H x W x 3 uint8 arrays).
+        Each image is downscaled so its longer side is at most working_size; images that
+        end up the same size share one detection forward pass. Returns, per image, a list
+        of polygons (N x 2 int32 arrays) in the original image coordinates.
+        """
+        scaled, scales = [], []
+        for img in images:
+            h, w = img.shape[:2]
+            scale = min(1.0, self.working_size / max(h, w)) if self.working_size else 1.0
+            if scale < 1.0:
+                img = cv2.resize(img, (int(round(w * scale)), int(round(h * scale))), interpolation=cv2.INTER_AREA)
+            scaled.append(img)
+            scales.append(scale)
+
+        groups = {}
+        for i, img in enumerate(scaled):
+            groups.setdefault(img.shape, []).append(i)
+
+        polygons = [None] * len(images)
+        for indices in groups.values():
+            batch = np.stack([scaled[i] for i in indices])
+            horizontal_lists, free_lists = self.reader.detect(batch, reformat=False)
+            for i, horizontal, free in zip(indices, horizontal_lists, free_lists):
+                boxes = [[[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]] for x_min, x_max, y_min, y_max in horizontal]
+                boxes += free
+                polygons[i] = [np.round(np.array(box, dtype=np.float32) / scales[i]).astype(np.int32) for box in boxes]
+        return polygons
+
+
+def get_text_detector():
+    """Returns the process-wide TextRegionDetector, loading it on first use."""
+    return model_manager.get('easyocr', TextRegionDetector, device=default_device(), footprint=FOOTPRINTS['easyocr'])
+
+
+def remove_text_with_easyocr_batch(pil_images):
+    """
+    Detects and removes text from several images with a single detector pass per image size.
+    :param pil_images: Input PIL images (or RGB arrays).
+    :return: Processed PIL images with text removed.
+    """
+    # Convert PIL images to NumPy arrays and then to BGR format
+    imgs = [cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR) for pil_image in pil_images]
 
-    # Inpaint the image using the mask
-    result = cv2.inpaint(img, mask, inpaintRadius=1, flags=cv2.INPAINT_NS)
+    results = []
+    for img, polygons in zip(imgs, get_text_detector().detect(imgs)):
+        # Create a mask for the detected text
+        mask = np.zeros(img.shape[:2], dtype=np.uint8)
+        for pts in polygons:
+            cv2.fillConvexPoly(mask, pts, 255)  # Fill the detected text area
 
-    # Convert BGR to RGB for PIL
-    result_rgb = cv2.cvtColor(result, cv2.COLOR_BGR2RGB)
+        # Inpaint the image using the mask
+        result = cv2.inpaint(img, mask, inpaintRadius=1, flags=cv2.INPAINT_NS)
 
-    # Convert NumPy array back to PIL Image
-    result_pil = Image.fromarray(result_rgb)
+        # Convert BGR to RGB and back to a PIL Image
+        results.append(Image.fromarray(cv2.cvtColor(result, cv2.COLOR_BGR2RGB)))
+    return results
 
-    return result_pil
+def remove_text_with_easyocr(pil_image):
+    """
+    Detects and removes text from a PIL image using EasyOCR and OpenCV.
+    :param pil_image: Input PIL image.
+    :return: Processed PIL image with text removed.
+    """
+    return remove_text_with_easyocr_batch([pil_image])[0]
 
 # Example usage
 # processed_image = remove_text_with_easyocr(pil_image)
@@ -294,7 +239,7 @@ def create_rounded_rectangle(draw, bbox, radius, outline=None, fill=None):
     # Apply the mask
     draw.bitmap((bbox[0], bbox[1]), mask, fill=fill)
 
-def create_button(image:Image, text, bbox, radius=15, icon_path='arrow-right-double-line.png', font_color='black', fill_color='white'):
+def create_button(image:Image, text, bbox, radius=15, icon_path='arrow-right-double-line.png', font_color='black', fill_color='white', font_loader=None):
     # Create a new image with the specified background color
 
     draw = ImageDraw.Draw(image)
@@ -304,11 +249,8 @@ def create_button(image:Image, text, bbox, radius=15, icon_path='arrow-right-dou
 
     # Set font size based on the bounding box height
     font_size = int((bbox[3] - bbox[1]) * 0.5)  # Use 50% of the bounding box height for font size
-    # Load a specific font (if available) or use default
-    try:
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except IOError:
-        font = ImageFont.load_default()
+    # Use the brand font (if given) or the default font
+    font = font_loader(font_size) if font_loader else load_font("arial.ttf", font_size)
 
     # Calculate text bounding box for centering
     text_bbox = draw.textbbox((0, 0), text, font=font)
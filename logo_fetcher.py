@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from lru import LRUCache
+from settings import (
+    LOGO_CACHE_DIR,
+    LOGO_CONNECT_TIMEOUT,
+    LOGO_MAX_BYTES,
+    LOGO_MEMORY_ENTRIES,
+    LOGO_MEMORY_TTL,
+    LOGO_READ_TIMEOUT,
+)
+
+
+class LogoTooLargeError(ValueError):
+    pass
+
+
+def _is_transient(error):
+    """
+    True for connection errors, timeouts and 5xx responses (including retried 502-504s
+    that ran out of retries). A 4xx means the logo was removed or the URL is wrong, so
+    the cached copy must not be served in its place.
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError))
+
+
+class LogoFetcher:
+    """
+    Downloads brand logos through a pooled HTTP session with timeouts and a size cap.
+    Bodies are kept in an on-disk cache keyed by URL and revalidated with
+    ETag/Last-Modified; decoded logos are kept in an in-memory LRU for LOGO_MEMORY_TTL seconds.
+    """
+
+    def __init__(self, cache_dir=LOGO_CACHE_DIR, connect_timeout=LOGO_CONNECT_TIMEOUT, read_timeout=LOGO_READ_TIMEOUT,
+                 max_bytes=LOGO_MAX_BYTES, memory_entries=LOGO_MEMORY_ENTRIES, memory_ttl=LOGO_MEMORY_TTL):
+        self.cache_dir = cache_dir
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.memory_ttl = memory_ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16,
+                              max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.decoded = LRUCache(maxsize=memory_entries)
+        self._lock = threading.Lock()
+        self.metrics = {'requests': 0, 'memory_hits': 0, 'revalidated': 0, 'downloads': 0,
+                        'stale_fallbacks': 0, 'fetch_seconds': 0.0}
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.metrics[name] += value
+
+    def _paths(self, url):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.bin'), os.path.join(self.cache_dir, digest + '.json')
+
+    def _write(self, path, data):
+        """Writes through a unique temp file, so concurrent fetches of one URL never share it."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _download(self, url, headers):
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304:
+                return response, None
+            response.raise_for_status()
+            length = response.headers.get('Content-Length')
+            if length is not None and int(length) > self.max_bytes:
+                raise LogoTooLargeError(f"Logo at {url} is {length} bytes; the limit is {self.max_bytes}.")
+            body = BytesIO()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.write(chunk)
+                if body.tell() > self.max_bytes:
+                    raise LogoTooLargeError(f"Logo at {url} exceeds {self.max_bytes} bytes.")
+            return response, body.getvalue()
+
+    def fetch_bytes(self, url):
+        """Returns the logo body, revalidating the on-disk copy when there is one."""
+        body_path, meta_path = self._paths(url)
+        meta = None
+        if os.path.isfile(body_path) and os.path.isfile(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response, body = self._download(url, headers)
+        except requests.RequestException as e:
+            if meta is None or not _is_transient(e):
+                raise
+            # The origin is unreachable or failing; serve the copy we already have.
+            self._count('stale_fallbacks')
+            with open(body_path, 'rb') as f:
+                return f.read()
+
+        if body is None:
+            self._count('revalidated')
+            with open(body_path, 'rb') as f:
+                return f.read()
+
+        self._count('downloads')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = json.dumps({'url': url, 'etag': response.headers.get('ETag'),
+                           'last_modified': response.headers.get('Last-Modified')})
+        self._write(body_path, body)
+        self._write(meta_path, meta.encode('utf-8'))
+        return body
+
+    def fetch(self, url):
+        """Returns the logo as an RGB PIL image."""
+        start = time.perf_counter()
+        self._count('requests')
+        cached = self.decoded.get(url)
+        if cached is not None and time.monotonic() - cached[1] < self.memory_ttl:
+            self._count('memory_hits')
+            image = cached[0].copy()
+        else:
+            image = Image.open(BytesIO(self.fetch_bytes(url))).convert("RGB")
+            self.decoded.put(url, (image, time.monotonic()))
+            image = image.copy()
+        self._count('fetch_seconds', time.perf_counter() - start)
+        return image
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        requests_count = metrics['requests']
+        cache_hits = metrics['memory_hits'] + metrics['revalidated'] + metrics['stale_fallbacks']
+        metrics['hit_rate'] = cache_hits / requests_count if requests_count else 0.0
+        metrics['mean_fetch_seconds'] = metrics['fetch_seconds'] / requests_count if requests_count else 0.0
+        metrics['memory'] = self.decoded.stats()
+        return metrics
+
+
+logo_fetcher = LogoFetcher()
@@ -12,9 +12,12 @@ from diffusers import (
     UniPCMultistepScheduler,
 )
 
+from batching import BatchScheduler, BatchSchedulerClosed, expand_items, image_seeds, split_results
+from control_cache import control_cache
 from cv_utils import resize_image
+from precision import PrecisionPolicy, get_policy
 from preprocessor import Preprocessor
-from settings import MAX_IMAGE_RESOLUTION, MAX_NUM_IMAGES
+from settings import BATCH_MAX_SIZE, BATCH_WAIT_MS, MAX_IMAGE_RESOLUTION, MAX_NUM_IMAGES
 
 CANNY_MODEL_ID = "lllyasviel/control_v11p_sd15_canny"
 
@@ -22,46 +25,121 @@ def download_canny_controlnet_weight() -> None:
     ControlNetModel.from_pretrained(CANNY_MODEL_ID)
 
 class Model:
-    def __init__(self, base_model_id: str = "runwayml/stable-diffusion-v1-5"):
-        self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    def __init__(
+        self,
+        base_model_id: str = "runwayml/stable-diffusion-v1-5",
+        controlnet_id: str = CANNY_MODEL_ID,
+        policy: PrecisionPolicy | str | None = None,
+    ):
+        if not isinstance(policy, PrecisionPolicy):
+            policy = get_policy(policy)
+        self.policy = policy
+        self.device = torch.device(policy.device)
+        self.dtype = policy.dtype
         self.base_model_id = base_model_id
+        self.controlnet_id = controlnet_id
         self.pipe = self.load_pipe(base_model_id)
         self.preprocessor = Preprocessor()
+        self.batcher = BatchScheduler(self._run_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_WAIT_MS)
 
     def load_pipe(self, base_model_id: str) -> DiffusionPipeline:
-        controlnet = ControlNetModel.from_pretrained(CANNY_MODEL_ID, torch_dtype=torch.float32)
+        controlnet = ControlNetModel.from_pretrained(self.controlnet_id, torch_dtype=self.dtype)
         pipe = StableDiffusionControlNetPipeline.from_pretrained(
-            base_model_id, safety_checker=None, controlnet=controlnet, torch_dtype=torch.float32
+            base_model_id, safety_checker=None, controlnet=controlnet, torch_dtype=self.dtype
         )
         pipe.scheduler = UniPCMultistepScheduler.from_config(pipe.scheduler.config)
-        if self.device.type == "cuda":
-            pipe.enable_xformers_memory_efficient_attention()
+        self.policy.apply(pipe)
         pipe.to(self.device)
         torch.cuda.empty_cache()
         gc.collect()
         return pipe
 
-    @torch.autocast("cuda")
+    def close(self) -> None:
+        """Stops the batch scheduler thread so the pipeline can be freed once dropped."""
+        self.batcher.close()
+
+    def resident_bytes(self) -> int:
+        """Approximate bytes held by the parameters and buffers of every pipeline module."""
+        total = 0
+        for component in self.pipe.components.values():
+            if not isinstance(component, torch.nn.Module):
+                continue
+            for tensor in list(component.parameters()) + list(component.buffers()):
+                total += tensor.numel() * tensor.element_size()
+        return total
+
     def run_pipe(
         self,
         prompt: str,
         negative_prompt: str,
-        control_image: PIL.Image.Image,
+        control_image: PIL.Image.Image | torch.Tensor,
         num_images: int,
         num_steps: int,
         guidance_scale: float,
         seed: int,
     ) -> list[PIL.Image.Image]:
-        generator = torch.Generator().manual_seed(seed)
-        return self.pipe(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
+        # One generator per image, seeded as _run_batch expands a request; a seeded
+        # request gives the same images whether or not it was batched.
+        generators = [torch.Generator().manual_seed(s) for s in image_seeds(seed, num_images)]
+        with self.policy.autocast():
+            return self.pipe(
+                prompt=prompt,
+                negative_prompt=negative_prompt,
+                guidance_scale=guidance_scale,
+                num_images_per_prompt=num_images,
+                num_inference_steps=num_steps,
+                generator=generators,
+                image=control_image,
+            ).images
+
+    def run_pipe_batch(
+        self,
+        prompts: list[str],
+        negative_prompts: list[str],
+        control_images: list[PIL.Image.Image | torch.Tensor],
+        num_steps: int,
+        guidance_scale: float,
+        seeds: list[int],
+    ) -> list[PIL.Image.Image]:
+        """Runs one image per entry in a single pipeline call, with a generator per entry."""
+        generators = [torch.Generator().manual_seed(seed) for seed in seeds]
+        with self.policy.autocast():
+            return self.pipe(
+                prompt=prompts,
+                negative_prompt=negative_prompts,
+                guidance_scale=guidance_scale,
+                num_images_per_prompt=1,
+                num_inference_steps=num_steps,
+                generator=generators,
+                image=control_images,
+            ).images
+
+    def _run_batch(self, key: tuple, items: list[dict]) -> list[list[PIL.Image.Image]]:
+        _, num_steps, guidance_scale = key
+        if len(items) == 1:
+            item = items[0]
+            return [
+                self.run_pipe(
+                    prompt=item["prompt"],
+                    negative_prompt=item["negative_prompt"],
+                    control_image=item["control_image"],
+                    num_images=item["num_images"],
+                    num_steps=num_steps,
+                    guidance_scale=guidance_scale,
+                    seed=item["seed"],
+                )
+            ]
+        # Expand each request into one entry per image, then split the results back out.
+        entries = expand_items(items)
+        images = self.run_pipe_batch(
+            prompts=[item["prompt"] for item, _ in entries],
+            negative_prompts=[item["negative_prompt"] for item, _ in entries],
+            control_images=[item["control_image"] for item, _ in entries],
+            num_steps=num_steps,
             guidance_scale=guidance_scale,
-            num_images_per_prompt=num_images,
-            num_inference_steps=num_steps,
-            generator=generator,
-            image=control_image,
-        ).images
+            seeds=[seed for _, seed in entries],
+        )
+        return split_results(items, images)
 
     @torch.inference_mode()
     def process_canny(
@@ -77,6 +155,7 @@ class Model:
         seed: int,
         low_threshold: int,
         high_threshold: int,
+        info: dict | None = None,
     ) -> list[PIL.Image.Image]:
         if image is None:
             raise ValueError("Input image cannot be None.")
@@ -85,18 +164,31 @@ class Model:
         if num_images > MAX_NUM_IMAGES:
             raise ValueError("Number of images exceeds the maximum allowed.")
 
-        self.preprocessor.load("Canny")
-        control_image = self.preprocessor(
-            image=image, low_threshold=low_threshold, high_threshold=high_threshold, detect_resolution=image_resolution
+        # Edge detection depends only on the template pixels and these three settings.
+        control_image, control_tensor = control_cache.canny(
+            image, image_resolution, low_threshold, high_threshold, self.preprocessor
         )
 
-        results = self.run_pipe(
-            prompt=f"{prompt}, {additional_prompt}",
-            negative_prompt=negative_prompt,
-            control_image=control_image,
-            num_images=num_images,
-            num_steps=num_steps,
-            guidance_scale=guidance_scale,
-            seed=seed,
-        )
+        # Requests sharing resolution, step count and guidance scale are batched together.
+        key = (control_image.size, num_steps, guidance_scale)
+        item = {
+            "prompt": f"{prompt}, {additional_prompt}",
+            "negative_prompt": negative_prompt,
+            "control_image": control_tensor,
+            "num_images": num_images,
+            "seed": seed,
+        }
+        future = None
+        if BATCH_MAX_SIZE > 1:
+            try:
+                future = self.batcher.submit(key, item)
+            except BatchSchedulerClosed:
+                # The model manager evicted this model mid-request; run it unbatched.
+                pass
+        if future is not None:
+            results, batch_size = future.result()
+        else:
+            results, batch_size = self._run_batch(key, [item])[0], 1
+        if info is not None:
+            info["batch_size"] = batch_size
         return [control_image] + results
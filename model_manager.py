@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import gc
+import threading
+import time
+from collections import OrderedDict
+
+import psutil
+import torch
+
+from settings import MODEL_RAM_BUDGET_MB, MODEL_VRAM_BUDGET_MB
+
+MB = 1024 * 1024
+
+# Approximate resident bytes per model, used to make room before a model loads.
+# Once loaded, a model is measured from its parameters and buffers where possible.
+FOOTPRINTS = {
+    'clip': 600 * MB,  # CLIP ViT-B/16, fp32
+    'yolo': 100 * MB,  # YOLOv8 box detector
+    'easyocr': 90 * MB,  # CRAFT text detector only
+    'gfpgan': 700 * MB,  # GFPGAN v1.4 + RetinaFace + face parsing (+ RealESRGAN x2 on CUDA)
+    'annotator': 500 * MB,  # ControlNet annotators (HED, Midas, DPT, UPerNet, ...)
+}
+# UNet + ControlNet + VAE + CLIP text encoder of SD 1.5; multiply by the dtype's element size.
+SD_CONTROLNET_PARAMETERS = 1_430_000_000
+
+
+def default_device():
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def _device_kind(device):
+    return 'cuda' if str(device).startswith('cuda') else 'cpu'
+
+
+def module_bytes(obj, depth=3, seen=None):
+    """
+    Sums the parameter and buffer bytes of every torch module reachable from obj through
+    at most depth levels of attributes. Returns 0 when no module is found.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, torch.nn.Module):
+        if hasattr(obj, 'resident_bytes'):
+            return obj.resident_bytes()
+        tensors = {id(t): t for t in list(obj.parameters()) + list(obj.buffers())}
+        return sum(t.numel() * t.element_size() for t in tensors.values())
+    if hasattr(obj, 'resident_bytes'):
+        return obj.resident_bytes()
+    if depth == 0 or not hasattr(obj, '__dict__'):
+        return 0
+    return sum(module_bytes(value, depth - 1, seen) for value in vars(obj).values())
+
+
+def _close(model):
+    """Calls the model's optional close() hook, which releases threads that would keep it alive."""
+    close = getattr(model, 'close', None)
+    if close is not None:
+        close()
+
+
+class _Entry:
+    def __init__(self, model, device, nbytes, load_time):
+        self.model = model
+        self.device = device
+        self.bytes = nbytes
+        self.load_time = load_time
+        self.last_used = time.monotonic()
+        self.hits = 0
+
+
+class ModelManager:
+    """
+    Owns every large model in the process and keeps each device within a memory budget.
+
+    Models are loaded on first use through get(), which records an approximate footprint.
+    When a model would push its device (RAM for CPU models, VRAM for CUDA models) over
+    budget, the least recently used models on that device are dropped first. Memory is
+    only collected after an eviction, not on every request.
+    """
+
+    def __init__(self, ram_budget=None, vram_budget=None):
+        if ram_budget is None:
+            ram_budget = MODEL_RAM_BUDGET_MB * MB if MODEL_RAM_BUDGET_MB else int(psutil.virtual_memory().total * 0.6)
+        if vram_budget is None:
+            if MODEL_VRAM_BUDGET_MB:
+                vram_budget = MODEL_VRAM_BUDGET_MB * MB
+            elif torch.cuda.is_available():
+                vram_budget = int(torch.cuda.get_device_properties(0).total_memory * 0.9)
+            else:
+                vram_budget = 0
+        self.budgets = {'cpu': ram_budget, 'cuda': vram_budget}
+        self._entries = OrderedDict()  # name -> _Entry, least recently used first
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _used(self, kind):
+        return sum(entry.bytes for entry in self._entries.values() if _device_kind(entry.device) == kind)
+
+    def _make_room(self, device, incoming, keep):
+        """Evicts least recently used models on device until incoming more bytes fit."""
+        kind = _device_kind(device)
+        evicted = []
+        with self._lock:
+            for name in list(self._entries):
+                if self._used(kind) + incoming <= self.budgets[kind]:
+                    break
+                entry = self._entries[name]
+                if name == keep or _device_kind(entry.device) != kind:
+                    continue
+                del self._entries[name]
+                self.evictions += 1
+                evicted.append((name, entry))
+        if evicted:
+            summary = ', '.join(f'{name} ({entry.bytes / MB:.0f} MB)' for name, entry in evicted)
+            for _, entry in evicted:
+                _close(entry.model)
+            # Drop our last references; callers still holding an evicted model free it when done.
+            del entry
+            evicted.clear()
+            print(f"Evicted {summary} to stay within the {kind} budget of {self.budgets[kind] / MB:.0f} MB")
+            gc.collect()
+            if kind == 'cuda':
+                torch.cuda.empty_cache()
+
+    def get(self, name, load, device='cpu', footprint=0):
+        """
+        Returns the model called name, calling load() to build it if it is not resident.
+
+        Args:
+            name (str): Unique name of the model.
+            load (callable): Builds the model; called at most once per residency.
+            device (str): Device the model lives on; selects the RAM or VRAM budget.
+            footprint (int): Approximate resident bytes, used to make room before loading.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                entry.last_used = time.monotonic()
+                entry.hits += 1
+                self.hits += 1
+                return entry.model
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Only one thread loads a given model; the others wait and reuse it.
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    self._entries.move_to_end(name)
+                    entry.last_used = time.monotonic()
+                    entry.hits += 1
+                    self.hits += 1
+                    return entry.model
+                self.misses += 1
+            self._make_room(device, footprint, keep=name)
+            start = time.perf_counter()
+            model = load()
+            load_time = time.perf_counter() - start
+            nbytes = module_bytes(model) or footprint
+            with self._lock:
+                self._entries[name] = _Entry(model, device, nbytes, load_time)
+            print(f"Loaded {name} on {device} in {load_time:.2f}s ({nbytes / MB:.0f} MB)")
+            # The measured size can exceed the estimate.
+            self._make_room(device, 0, keep=name)
+            return model
+
+    def peek(self, name):
+        """Returns the model if it is resident, without loading it or marking it as used."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry.model if entry is not None else None
+
+    def unload(self, name) -> bool:
+        with self._lock:
+            entry = self._entries.pop(name, None)
+        if entry is None:
+            return False
+        _close(entry.model)
+        gc.collect()
+        if _device_kind(entry.device) == 'cuda':
+            torch.cuda.empty_cache()
+        return True
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'budgets': dict(self.budgets),
+                'used': {kind: self._used(kind) for kind in self.budgets},
+                'resident': [
+                    {
+                        'name': name,
+                        'device': str(entry.device),
+                        'bytes': entry.bytes,
+                        'load_time': entry.load_time,
+                        'hits': entry.hits,
+                        'idle_seconds': now - entry.last_used,
+                    }
+                    for name, entry in reversed(self._entries.items())
+                ],
+            }
+
+
+model_manager = ModelManager()
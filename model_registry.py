@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import torch
+
+from model import CANNY_MODEL_ID, Model
+from model_manager import SD_CONTROLNET_PARAMETERS, model_manager
+from precision import PrecisionPolicy, get_policy
+from settings import DEFAULT_MODEL_ID
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded Stable Diffusion + ControlNet models.
+
+    Each ``Model`` is built once per (base model, ControlNet, precision policy) and
+    handed to every request that asks for the same combination. The policy fixes
+    the dtype and device. The models themselves are held by ``model_manager``, which
+    may evict them to load others within the memory budget.
+    """
+
+    def __init__(self, manager=model_manager):
+        self.manager = manager
+        self._keys = set()
+        self._load_times = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _resolve(policy):
+        return policy if isinstance(policy, PrecisionPolicy) else get_policy(policy)
+
+    @staticmethod
+    def _key(base_model_id, controlnet_id, policy):
+        return (base_model_id, controlnet_id, str(policy.dtype), policy.device, policy.name)
+
+    def key(
+        self,
+        base_model_id: str = DEFAULT_MODEL_ID,
+        controlnet_id: str = CANNY_MODEL_ID,
+        policy: PrecisionPolicy | str | None = None,
+    ) -> tuple:
+        """Returns the (base model, ControlNet, dtype, device, policy name) that get() loads for these arguments."""
+        return self._key(base_model_id, controlnet_id, self._resolve(policy))
+
+    @staticmethod
+    def _name(key):
+        return "sd:" + "|".join(key)
+
+    def get(
+        self,
+        base_model_id: str = DEFAULT_MODEL_ID,
+        controlnet_id: str = CANNY_MODEL_ID,
+        policy: PrecisionPolicy | str | None = None,
+    ) -> Model:
+        policy = self._resolve(policy)
+        key = self._key(base_model_id, controlnet_id, policy)
+        loaded = False
+
+        def load():
+            nonlocal loaded
+            loaded = True
+            start = time.perf_counter()
+            model = Model(base_model_id=base_model_id, controlnet_id=controlnet_id, policy=policy)
+            load_time = time.perf_counter() - start
+            with self._lock:
+                self._load_times[key] = load_time
+            print(f"Loaded {base_model_id} + {controlnet_id} ({policy.name}, {policy.device}) in {load_time:.2f}s")
+            return model
+
+        footprint = SD_CONTROLNET_PARAMETERS * torch.empty((), dtype=policy.dtype).element_size()
+        model = self.manager.get(self._name(key), load, device=policy.device, footprint=footprint)
+        with self._lock:
+            self._keys.add(key)
+            if loaded:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return model
+
+    def unload(self, base_model_id, controlnet_id=CANNY_MODEL_ID, policy=None) -> bool:
+        key = self._key(base_model_id, controlnet_id, self._resolve(policy))
+        with self._lock:
+            self._keys.discard(key)
+            self._load_times.pop(key, None)
+        return self.manager.unload(self._name(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = list(self._keys)
+            load_times = dict(self._load_times)
+            hits, misses = self.hits, self.misses
+        models = []
+        for key in keys:
+            model = self.manager.peek(self._name(key))
+            if model is None:
+                continue
+            models.append({
+                "base_model_id": key[0],
+                "controlnet_id": key[1],
+                "dtype": key[2],
+                "device": key[3],
+                "policy": key[4],
+                "load_time": load_times.get(key),
+                "resident_bytes": model.resident_bytes(),
+                "preprocessor": model.preprocessor.stats(),
+            })
+        return {
+            "hits": hits,
+            "misses": misses,
+            "resident_bytes": sum(m["resident_bytes"] for m in models),
+            "models": models,
+        }
+
+
+model_registry = ModelRegistry()
@@ -1,5 +1,31 @@
+import hashlib
+import json
 import re
+import time
+
 import ollama
+import psutil
+
+from lru import LRUCache
+from settings import (
+    COPY_CACHE_ENTRIES,
+    COPY_CACHE_TTL,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MODEL,
+    OLLAMA_NUM_PREDICT,
+    OLLAMA_UNLOAD_MEMORY_PERCENT,
+)
+
+# BrandCreation fields that get_title_prompt reads; only these go into the copy cache key.
+PROMPT_FIELDS = [
+    'name', 'tagline', 'audience_interest', 'industry', 'demographic', 'psychographic', 'keywords',
+    'visual_style', 'tone_of_voice', 'current_campaign', 'season', 'mood', 'cta_text',
+]
+
+# Parsed copy per prompt, stored as (details, time).
+copy_cache = LRUCache(maxsize=COPY_CACHE_ENTRIES)
+
+
 def get_title_prompt(instance):
   
     # Create the structured output format prompt
@@ -67,9 +93,83 @@ def extract_poster_details(llm_response):
         "hashtags": hashtags.split() if hashtags else []
     }
 
-def ollama_generate(instance,type='prompt'):
-    prompt=get_title_prompt(instance=instance)
-    res=ollama.generate(model='llama3.1',prompt=prompt)
-    return extract_poster_details(llm_response=res['response'])
-    
+def copy_complete(llm_response):
+    """True once the streamed response has a Title and a finished Description section."""
+    llm_response = llm_response.replace("**", "")
+    if not re.search(r"^Title:\s*\S", llm_response, re.MULTILINE):
+        return False
+    # The description is finished once a blank line or the next section follows it.
+    return re.search(r"^Description:\s*\S.*?(\n\n|\n\S[^\n]*:)", llm_response, re.MULTILINE | re.DOTALL) is not None
+
+
+def stream_copy(prompt, model=OLLAMA_MODEL):
+    """
+    Streams the LLM response and stops as soon as Title and Description are complete, so
+    no tokens are spent on the call to action and hashtags. The model stays loaded for
+    OLLAMA_KEEP_ALIVE and the response is capped at OLLAMA_NUM_PREDICT tokens.
+    """
+    stream = ollama.generate(model=model, prompt=prompt, stream=True, keep_alive=OLLAMA_KEEP_ALIVE,
+                             options={'num_predict': OLLAMA_NUM_PREDICT})
+    text = ''
+    try:
+        for chunk in stream:
+            text += chunk['response']
+            if copy_complete(text):
+                break
+    finally:
+        # Closing the generator drops the HTTP stream, which makes Ollama stop generating.
+        stream.close()
+    return text
 
+
+def unload_if_memory_pressure(model=OLLAMA_MODEL, threshold=OLLAMA_UNLOAD_MEMORY_PERCENT):
+    """
+    Asks Ollama to unload the model (keep_alive=0) when system memory use is above
+    threshold percent, so the diffusion models are not pushed into swap.
+
+    Returns:
+        bool: Whether an unload was requested.
+    """
+    percent = psutil.virtual_memory().percent
+    if percent < threshold:
+        return False
+    try:
+        # An empty prompt would load a model that is not resident, so check first.
+        if not any(m['name'].split(':')[0] == model.split(':')[0] for m in ollama.ps()['models']):
+            return False
+        ollama.generate(model=model, prompt='', keep_alive=0)
+    except Exception as e:
+        print(f"Could not unload {model}: {e}")
+        return False
+    print(f"Memory at {percent:.0f}%; unloaded {model}")
+    return True
+
+
+def copy_key(instance, model=OLLAMA_MODEL):
+    """Hashes the prompt-relevant BrandCreation fields and the model name."""
+    fields = {}
+    for name in PROMPT_FIELDS:
+        value = getattr(instance, name)
+        fields[name] = ' '.join(value.split()) if isinstance(value, str) else value
+    payload = json.dumps({'model': model, 'fields': fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def ollama_generate(instance, type='prompt', force=False):
+    """
+    Returns the parsed {title, description, hashtags} for the brand.
+
+    Results are cached per copy_key for COPY_CACHE_TTL seconds; force skips the cached
+    copy and replaces it with a fresh generation.
+    """
+    key = copy_key(instance)
+    if not force:
+        cached = copy_cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] < COPY_CACHE_TTL:
+            return dict(cached[0])
+    prompt=get_title_prompt(instance=instance)
+    details = extract_poster_details(llm_response=stream_copy(prompt))
+    # Don't keep responses that did not parse; the next request should try again.
+    if details['title'] and details['description']:
+        copy_cache.put(key, (dict(details), time.monotonic()))
+    return details
@@ -0,0 +1,105 @@
+# Recovery and retention for generation jobs. Kept apart from parameters.jobs so that
+# app startup does not import the generation pipeline.
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+import psutil
+from django.utils import timezone
+
+from parameters.models import GenerationJob
+from settings import GENERATED_IMAGE_DIR, GENERATED_IMAGE_TTL
+
+# How often finished jobs run maintenance (interrupted jobs and expired results).
+_CLEANUP_INTERVAL = 3600
+_last_cleanup = 0.0
+_cleanup_lock = threading.Lock()
+
+
+def process_owner(pid=None):
+    """
+    Identifies the process that runs a job as host:pid:start time. The start time tells
+    a process apart from a later one that reused its pid.
+    """
+    process = psutil.Process(pid)
+    return f"{socket.gethostname()}:{process.pid}:{process.create_time():.0f}"
+
+
+def _owner_alive(owner):
+    """
+    True if owner may still be running its jobs. Only processes on this host can be
+    checked; owners on other hosts are assumed alive and left to their own host.
+    """
+    try:
+        host, pid, _ = owner.rsplit(':', 2)
+        pid = int(pid)
+    except ValueError:
+        # Jobs created before owners were recorded have no process left to run them.
+        return False
+    if host != socket.gethostname():
+        return True
+    try:
+        return process_owner(pid) == owner
+    except psutil.Error:
+        return False
+
+
+def recover_interrupted_jobs():
+    """
+    Marks queued or running jobs whose owning process has exited as failed.
+
+    Jobs only run on the thread pool of the process that accepted them, so once that
+    process is gone nothing will finish them. Jobs of live processes, including other
+    workers of the same server, are left alone.
+    """
+    jobs = GenerationJob.objects.filter(status__in=['queued', 'running'])
+    owners = set(jobs.values_list('owner', flat=True))
+    gone = [owner for owner in owners if not _owner_alive(owner)]
+    if not gone:
+        return 0
+    count = jobs.filter(owner__in=gone).update(
+        status='failed',
+        stage='',
+        error='Interrupted by a server restart; submit the request again.',
+        updated_at=timezone.now(),
+    )
+    if count:
+        print(f"Marked {count} interrupted generation jobs as failed")
+    return count
+
+
+def remove_expired_results(max_age=GENERATED_IMAGE_TTL):
+    """
+    Deletes result files older than max_age seconds from GENERATED_IMAGE_DIR and clears
+    the result_path of their jobs, whose result endpoint then answers 410 Gone.
+    """
+    removed = 0
+    cutoff = time.time() - max_age
+    if os.path.isdir(GENERATED_IMAGE_DIR):
+        for file in os.listdir(GENERATED_IMAGE_DIR):
+            path = os.path.join(GENERATED_IMAGE_DIR, file)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    GenerationJob.objects.filter(
+        status='succeeded', updated_at__lt=timezone.now() - timedelta(seconds=max_age)
+    ).exclude(result_path='').update(result_path='')
+    if removed:
+        print(f"Removed {removed} generated images older than {max_age:.0f}s")
+    return removed
+
+
+def maybe_maintain_jobs():
+    """Runs recover_interrupted_jobs and remove_expired_results at most once per _CLEANUP_INTERVAL seconds."""
+    global _last_cleanup
+    with _cleanup_lock:
+        if time.monotonic() - _last_cleanup < _CLEANUP_INTERVAL:
+            return
+        _last_cleanup = time.monotonic()
+    recover_interrupted_jobs()
+    remove_expired_results()
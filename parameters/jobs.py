@@ -0,0 +1,80 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import DatabaseError, close_old_connections
+
+from parameters.job_maintenance import maybe_maintain_jobs, process_owner
+from parameters.models import GenerationJob
+from parameters.pipeline import STAGES, generate_poster
+from settings import GENERATED_IMAGE_DIR, GENERATION_WORKERS, MAX_QUEUED_JOBS
+
+
+class QueueFullError(Exception):
+    pass
+
+
+_executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix='generation')
+# Bounds queued + running jobs so a burst of clients cannot grow the backlog without limit.
+_slots = threading.BoundedSemaphore(MAX_QUEUED_JOBS)
+
+
+def submit_job(instance, seed=None, regenerate_copy=False):
+    """Creates a GenerationJob for a saved BrandCreation and queues it on the worker pool."""
+    if not _slots.acquire(blocking=False):
+        raise QueueFullError(f"{MAX_QUEUED_JOBS} generation jobs are already queued.")
+    try:
+        job = GenerationJob.objects.create(
+            brand_creation=instance,
+            owner=process_owner(),
+            progress={stage: 'pending' for stage in STAGES},
+        )
+        _executor.submit(_run_job, job.id, seed, regenerate_copy)
+    except Exception:
+        _slots.release()
+        raise
+    return job
+
+
+def _run_job(job_id, seed=None, regenerate_copy=False):
+    try:
+        job = GenerationJob.objects.select_related('brand_creation').get(id=job_id)
+        job.status = 'running'
+        job.save(update_fields=['status', 'updated_at'])
+
+        progress_lock = threading.Lock()
+
+        def progress(stage, state):
+            # Stages run concurrently, so updates arrive from several threads.
+            with progress_lock:
+                job.progress[stage] = state
+                running = [name for name in STAGES if job.progress.get(name) == 'running']
+                job.stage = ', '.join(running)
+                # Progress is best effort: a busy database must not fail the poster.
+                try:
+                    job.save(update_fields=['stage', 'progress', 'updated_at'])
+                except DatabaseError as e:
+                    print(f"Could not save progress of job {job.id}: {e}")
+                finally:
+                    # Stage pool threads are not request threads; drop their connections here.
+                    close_old_connections()
+
+        try:
+            image = generate_poster(job.brand_creation, progress=progress, seed=seed,
+                                   regenerate_copy=regenerate_copy)
+            os.makedirs(GENERATED_IMAGE_DIR, exist_ok=True)
+            result_path = os.path.join(GENERATED_IMAGE_DIR, f'{job.id}.png')
+            image.save(result_path, format='PNG')
+            job.progress = {stage: 'done' for stage in STAGES}
+            job.result_path = result_path
+            job.status = 'succeeded'
+        except Exception as e:
+            print(traceback.format_exc())
+            job.status = 'failed'
+            job.error = str(e)
+        job.save()
+        maybe_maintain_jobs()
+    finally:
+        _slots.release()
+        close_old_connections()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from template_analysis import TemplateAnalysisStore
+
+
+class Command(BaseCommand):
+    help = 'Precomputes boxes and text-free images for templates that were added or changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild every template, not only stale ones.')
+
+    def handle(self, *args, **options):
+        rebuilt = TemplateAnalysisStore().rebuild(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Analyzed {len(rebuilt)} templates.'))
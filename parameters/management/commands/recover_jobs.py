@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from parameters.job_maintenance import recover_interrupted_jobs, remove_expired_results
+
+
+class Command(BaseCommand):
+    help = 'Fails generation jobs whose server process has exited and removes expired results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-results', action='store_true', help='Only recover jobs; do not remove expired results.')
+
+    def handle(self, *args, **options):
+        recovered = recover_interrupted_jobs()
+        removed = 0 if options['keep_results'] else remove_expired_results()
+        self.stdout.write(self.style.SUCCESS(f'Failed {recovered} interrupted jobs and removed {removed} expired results.'))
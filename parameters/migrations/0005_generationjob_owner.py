@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parameters', '0004_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='owner',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
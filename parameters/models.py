@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 class BrandCreation(models.Model):
     logo = models.CharField(max_length=255)
@@ -41,6 +42,25 @@ class BrandCreation(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
 
+
+class GenerationJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    brand_creation = models.ForeignKey(BrandCreation, on_delete=models.CASCADE, related_name='jobs')
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    stage = models.CharField(max_length=50, blank=True, default='')
+    progress = models.JSONField(default=dict)  # Stage name -> pending/running/done
+    result_path = models.CharField(max_length=255, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    owner = models.CharField(max_length=255, blank=True, default='')  # host:pid:start time of the running process
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
 def get_string(instance):
     prompt = (
     f"Generate similar images for the brand '{instance.name}' with the following details:\n"
@@ -0,0 +1,261 @@
+from colors import get_color_rgb
+from PIL import Image
+from model_registry import model_registry
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from image_utils import draw_multiline_text_in_bbox,create_button
+from text_layout import layout_text
+from fonts import font_registry
+from logo_fetcher import logo_fetcher
+from result_cache import result_cache, result_key
+from image_encoder import encode_to_budget
+from ollamma import ollama_generate, unload_if_memory_pressure
+import gc
+import torch
+from enhancer.services import enhance
+from parameters.models import get_string
+from settings import CONTROL_CACHE_WARMUP, DEFAULT_MODEL_ID, STAGE_WORKERS
+from control_cache import control_cache
+from preprocessor import Preprocessor
+
+from template_analysis import TemplateAnalysisStore
+
+from clip import ImageTextMatcher
+template_matcher=ImageTextMatcher()
+template_matcher.load_images_and_create_embeddings()
+template_store=TemplateAnalysisStore()
+
+# Stages reported to the progress callback.
+STAGES = ['template', 'copy', 'logo', 'diffusion', 'enhance', 'text']
+
+# Diffusion settings; they are part of the result cache key.
+GENERATION_PARAMS = {
+    'additional_prompt': "best quality, extremely detailed",
+    'negative_prompt': "longbody, lowres, bad anatomy, bad hands, missing fingers, extra digit, fewer digits, cropped, worst quality, low quality",
+    'num_images': 1,
+    'image_resolution': 768,
+    'num_steps': 5,
+    'guidance_scale': 10,
+    'low_threshold': 100,
+    'high_threshold': 200,
+}
+
+# Runs the independent stages of concurrent generations.
+_stage_pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='stage')
+
+
+def warm_control_cache():
+    """
+    Fills the control image cache for every analysed template at the default
+    GENERATION_PARAMS. Templates with a logo box are skipped: their control image
+    depends on the brand's logo.
+    """
+    preprocessor = Preprocessor(capacity=1, preload=[])
+    warmed = 0
+    for name in template_store.template_names():
+        # Analysing a stale template needs YOLO and EasyOCR; leave that to the first request.
+        if template_store.is_stale(name):
+            continue
+        analysis = template_store.get(name)
+        if 'logo' in analysis.boxes:
+            continue
+        control_cache.canny(analysis.image, GENERATION_PARAMS['image_resolution'], GENERATION_PARAMS['low_threshold'],
+                            GENERATION_PARAMS['high_threshold'], preprocessor)
+        warmed += 1
+    print(f"Warmed the control image cache for {warmed} templates")
+    stats = control_cache.stats()
+    if stats['entries'] < warmed:
+        print(f"The control image cache holds only {stats['entries']} of {warmed} warmed templates "
+              f"({stats['bytes'] / (1024 * 1024):.0f} MB); raise CONTROL_CACHE_MAX_BYTES to keep them all")
+    return warmed
+
+
+if CONTROL_CACHE_WARMUP:
+    _stage_pool.submit(warm_control_cache)
+
+
+def clear_cuda_cache():
+    """Clear CUDA cache to free up memory."""
+    gc.collect()
+    torch.cuda.empty_cache()
+def draw_all_text(instance, ollama_data, boxes, image):
+    predicted_class = boxes.keys()
+    primary_color=instance.colors['primary']
+    secondary_color=instance.colors['secondary']
+    print(predicted_class)
+    if 'title' in predicted_class:
+        print("Drawing title...")
+        layout = layout_text(ollama_data['title'], boxes['title'][0], font_loader=font_registry.loader(instance.title_font))
+        image = draw_multiline_text_in_bbox(image=image, text=ollama_data['title'], bbox=boxes['title'][0], layout=layout
+                                            ,gradient_start=get_color_rgb(primary_color),gradient_end=get_color_rgb(secondary_color))
+
+    if 'action button' in predicted_class:
+        print("Drawing action button...")
+        image = create_button(image=image, text=instance.cta_text, bbox=boxes['action button'][0]
+                                      ,font_color=get_color_rgb(primary_color),fill_color=secondary_color
+                                      ,font_loader=font_registry.loader(instance.body_font))
+
+    if 'Subheading' in predicted_class:
+        print("Drawing subheading...")
+        layout = layout_text(ollama_data['description'], boxes['Subheading'][0], font_loader=font_registry.loader(instance.subtitle_font))
+        image = draw_multiline_text_in_bbox(image=image, text=ollama_data['description'], bbox=boxes['Subheading'][0], layout=layout
+                                       ,gradient_start=get_color_rgb(primary_color),gradient_end=get_color_rgb(secondary_color))
+
+    return image
+
+
+
+
+def resize_image(image, max_size_kb=300):
+
+    """Resize image to ensure it is under the specified size."""
+    result = encode_to_budget(image, max_size_kb * 1024, format='JPEG')
+    print(f"Encoded logo to {len(result.data) / 1024:.1f} KB at scale {result.scale:.2f} in {result.passes} passes")
+    return result.image
+
+
+def build_prompt(instance):
+    return f"""
+        Design a vibrant poster for {instance.name}
+        in the {instance.industry} industry, using
+        {instance.colors}. Capture a {instance.tone_of_voice}
+        tone with {instance.title_font} for the title. Highlight
+        the campaign: '{instance.current_campaign}', include the
+        tagline: '{instance.tagline}', and a call-to-action:
+        '{instance.cta_text}', appealing to {instance.audience_interest}.
+    """
+
+
+def load_template(instance, seed=None):
+    """Picks a template for the brand and returns its name, boxes and text-free image."""
+    rng = random.Random(seed) if seed is not None else None
+    # Boxes and the text-free template are precomputed per template file.
+    analysis = template_store.get(template_matcher.fetch_images_based_on_text(get_string(instance=instance), rng=rng))
+    return analysis.name, analysis.boxes, analysis.image
+
+
+def generate_copy(instance, force=False):
+    data = ollama_generate(instance=instance, force=force)
+    # The model stays warm between requests unless memory is tight.
+    if unload_if_memory_pressure():
+        clear_cuda_cache()
+    return data
+
+
+def fetch_logo(logo_url):
+    image = logo_fetcher.fetch(logo_url)
+    return resize_image(image, 50)
+
+
+def generate_poster(instance, progress=None, info=None, seed=None, regenerate_copy=False):
+    """
+    Runs the full poster pipeline for a saved BrandCreation.
+
+    The template lookup, LLM copy and logo download do not depend on each other, so they
+    run concurrently on the stage pool; diffusion waits only for the template and logo,
+    and text rendering is the first step that needs the copy.
+
+    With a seed the template pick and diffusion are repeatable, so the finished poster is
+    cached under a hash of the brand fields, template, seed, GENERATION_PARAMS and the
+    model registry key (base model, ControlNet, precision policy), and a repeat request
+    returns it without running any model.
+
+    Args:
+        instance (BrandCreation): The brand to generate a poster for.
+        progress (callable): Optional callback, called as progress(stage, state) with a stage
+            from STAGES and state 'running' or 'done'. It may be called from several threads.
+        info (dict): Optional dict that receives run details: 'result_cache' (hit, miss,
+            refresh or off), the diffusion batch size, the enhance decision ('enhance': faces
+            found, whether GFPGAN ran and the time saved) and per-stage timings ('timings',
+            'wall_seconds', 'serial_seconds', 'saved_seconds').
+        seed (int): Optional client-supplied seed; a random one is drawn when omitted.
+        regenerate_copy (bool): Skip the cached LLM copy (and any cached poster) and
+            generate fresh copy.
+
+    Returns:
+        Image.Image: The finished poster.
+    """
+    if info is None:
+        info = {}
+    timings = {}
+
+    def run_stage(stage, fn, *args):
+        if progress is not None:
+            progress(stage, 'running')
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        finally:
+            timings[stage] = time.perf_counter() - start
+        if progress is not None:
+            progress(stage, 'done')
+        return result
+
+    start = time.perf_counter()
+    template_future = _stage_pool.submit(run_stage, 'template', load_template, instance, seed)
+    cache_key = None
+    if seed is not None:
+        # The template is needed for the cache key, so look it up before starting the other stages.
+        template_name = template_future.result()[0]
+        # The stamp makes posters built from a template that was since edited in place miss.
+        template = {'name': template_name, **template_store.stamp(template_name)}
+        # The model and precision policy change the pixels as much as the diffusion settings do.
+        params = {**GENERATION_PARAMS, 'model': model_registry.key(base_model_id=DEFAULT_MODEL_ID)}
+        cache_key = result_key(instance, template, seed, params)
+        cached = None if regenerate_copy else result_cache.get(cache_key)
+        if cached is not None:
+            info['result_cache'] = 'hit'
+            return cached
+        info['result_cache'] = 'refresh' if regenerate_copy else 'miss'
+    else:
+        info['result_cache'] = 'off'
+        seed = random.choice(range(0, 2147483647))
+    copy_future = _stage_pool.submit(run_stage, 'copy', generate_copy, instance, regenerate_copy)
+    # The logo is fetched speculatively; it is only used if the template has a logo box.
+    logo_future = _stage_pool.submit(run_stage, 'logo', fetch_logo, instance.logo)
+    prompt = build_prompt(instance)
+
+    _, boxes, final_template = template_future.result()
+    if 'logo' in boxes.keys():
+        image = logo_future.result()
+        # Extract bounding box coordinates
+        x, y, w, h = boxes['logo'][0]
+        # Calculate the size to paste (width and height)
+        paste_size = (int(w - x), int(h - y))
+        # Resize the image to fit within the bounding box using BICUBIC filter
+        image = image.resize(paste_size, Image.BICUBIC)
+        # Paste the image onto the final template
+        final_template.paste(image, (int(x), int(y)))
+
+    def diffusion():
+        model = model_registry.get(base_model_id=DEFAULT_MODEL_ID)
+        return model.process_canny(
+            image=final_template,
+            prompt=prompt,
+            seed=seed,
+            info=info,
+            **GENERATION_PARAMS,
+        )[1]
+
+    generated_image = run_stage('diffusion', diffusion)
+    print(f"Diffusion ran in a batch of {info['batch_size']}")
+    generated_image=generated_image.resize(final_template.size)
+    enhance_info = {}
+    generated_image = run_stage('enhance', enhance, generated_image, enhance_info)
+    info['enhance'] = enhance_info
+    data = copy_future.result()
+    generated_image = run_stage('text', draw_all_text, instance, data, boxes, generated_image)
+
+    if cache_key is not None:
+        result_cache.put(cache_key, generated_image)
+
+    wall = time.perf_counter() - start
+    serial = sum(timings.values())
+    info['timings'] = dict(timings)
+    info['wall_seconds'] = wall
+    info['serial_seconds'] = serial
+    info['saved_seconds'] = serial - wall
+    print(f"Stage timings: {', '.join(f'{k}={v:.2f}s' for k, v in timings.items())}; "
+          f"wall {wall:.2f}s, {serial - wall:.2f}s saved by running stages concurrently")
+    return generated_image
@@ -0,0 +1,169 @@
+import base64
+import json
+import uuid
+
+from django.http import FileResponse, HttpResponse
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.response import Response
+
+from image_encoder import encode, encode_to_budget, save
+from settings import JPEG_QUALITY, PNG_COMPRESS_LEVEL, WEBP_QUALITY
+
+IMAGE_FORMATS = {
+    'image/png': 'PNG',
+    'image/jpeg': 'JPEG',
+    'image/webp': 'WEBP',
+}
+# Upper bound for ?max_kb=; larger budgets are no budget at all for a poster.
+MAX_KB_LIMIT = 65536
+OUTPUT_ALIASES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'jpg': 'image/jpeg',
+    'webp': 'image/webp',
+    'multipart': 'multipart/mixed',
+    'json': 'application/json',
+}
+
+
+class ImageContentNegotiation(DefaultContentNegotiation):
+    """Lets image and multipart Accept headers through to the view instead of answering 406."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return (renderers[0], renderers[0].media_type)
+
+
+def _accepted_types(request):
+    """Returns the media types in the Accept header, best first."""
+    output = request.query_params.get('output')
+    if output in OUTPUT_ALIASES:
+        return [OUTPUT_ALIASES[output]]
+    types = []
+    for i, item in enumerate(request.META.get('HTTP_ACCEPT', '').split(',')):
+        parts = [p.strip() for p in item.split(';')]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            types.append((-q, i, parts[0].lower()))
+    return [media_type for _, _, media_type in sorted(types)]
+
+
+def _encode_params(format):
+    if format == 'PNG':
+        return {'compress_level': PNG_COMPRESS_LEVEL}
+    return {'quality': JPEG_QUALITY if format == 'JPEG' else WEBP_QUALITY}
+
+
+def _max_kb(request):
+    """Returns the ?max_kb= budget as an int, None when absent; raises ValueError when invalid."""
+    max_kb = request.query_params.get('max_kb')
+    if not max_kb:
+        return None
+    max_kb = int(max_kb)
+    if not 1 <= max_kb <= MAX_KB_LIMIT:
+        raise ValueError(max_kb)
+    return max_kb
+
+
+def validate_max_kb(request):
+    """Returns a 400 response when ?max_kb= is present but invalid, otherwise None."""
+    try:
+        _max_kb(request)
+    except ValueError:
+        return Response({'max_kb': [f'max_kb must be an integer between 1 and {MAX_KB_LIMIT}.']},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+def _image_bytes(request, image, format):
+    max_kb = _max_kb(request)
+    if max_kb and format in ('JPEG', 'WEBP'):
+        result = encode_to_budget(image, max_kb * 1024, format=format, quality=_encode_params(format)['quality'],
+                                  min_quality=50)
+        return result.data
+    return encode(image, format=format, **_encode_params(format))
+
+
+def _negotiate(request, default_type):
+    for media_type in _accepted_types(request):
+        if media_type in IMAGE_FORMATS or media_type in ('multipart/mixed', 'application/json'):
+            return media_type
+        if media_type == 'image/*':
+            # Any image will do; PNG is lossless.
+            return 'image/png'
+        if media_type in ('*/*', 'application/*'):
+            break
+    return default_type
+
+
+def image_response(request, image, brand_creation=None, status_code=status.HTTP_200_OK, default_type='application/json'):
+    """
+    Returns the generated image in the representation the client asked for.
+
+    Accept (or ?output=) selects raw image/png, image/jpeg or image/webp bodies, a
+    multipart/mixed body with the BrandCreation JSON and the image, or the JSON body with a
+    base64 PNG. image/* gets PNG; */*, application/* and a missing Accept header get
+    default_type. For JPEG and WebP, ?max_kb= sets a size budget; an invalid one is
+    answered with 400.
+    """
+    invalid = validate_max_kb(request)
+    if invalid is not None:
+        return invalid
+    media_type = _negotiate(request, default_type)
+    if media_type in IMAGE_FORMATS:
+        format = IMAGE_FORMATS[media_type]
+        response = HttpResponse(content_type=media_type, status=status_code)
+        if _max_kb(request) and format != 'PNG':
+            response.write(_image_bytes(request, image, format))
+        else:
+            # Encode straight into the response body, without an intermediate buffer.
+            save(image, response, format=format, **_encode_params(format))
+        return response
+
+    if media_type == 'multipart/mixed':
+        image_type = request.query_params.get('image_type', 'image/png')
+        if image_type not in IMAGE_FORMATS:
+            image_type = 'image/png'
+        boundary = uuid.uuid4().hex
+        response = HttpResponse(content_type=f'multipart/mixed; boundary={boundary}', status=status_code)
+        response.write(f'--{boundary}\r\nContent-Type: application/json\r\n\r\n'.encode())
+        response.write(json.dumps(brand_creation, default=str).encode())
+        response.write(f'\r\n--{boundary}\r\nContent-Type: {image_type}\r\n\r\n'.encode())
+        response.write(_image_bytes(request, image, IMAGE_FORMATS[image_type]))
+        response.write(f'\r\n--{boundary}--\r\n'.encode())
+        return response
+
+    # Convert generated image to Base64
+    generated_image_base64 = base64.b64encode(encode(image, format='PNG', **_encode_params('PNG'))).decode('utf-8')
+    response_data = {
+        'brand_creation': brand_creation,
+        'generated_image': generated_image_base64,
+    }
+    return Response(response_data, status=status_code)
+
+
+def stored_image_response(request, path, brand_creation=None, default_type='image/png'):
+    """
+    Like image_response for a PNG already on disk: when the client wants PNG the file is
+    streamed as it is, without decoding and re-encoding it.
+    """
+    invalid = validate_max_kb(request)
+    if invalid is not None:
+        return invalid
+    if _negotiate(request, default_type) == 'image/png':
+        return FileResponse(open(path, 'rb'), content_type='image/png')
+    image = Image.open(path)
+    return image_response(request, image, brand_creation, default_type=default_type)
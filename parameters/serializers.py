@@ -1,8 +1,14 @@
 # serializers.py
 from rest_framework import serializers
-from .models import BrandCreation
+from .models import BrandCreation, GenerationJob
 
 class BrandCreationSerializer(serializers.ModelSerializer):
     class Meta:
         model = BrandCreation
         fields = '__all__'  # Include all fields from the model
+
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GenerationJob
+        fields = ['id', 'brand_creation', 'status', 'stage', 'progress', 'error', 'created_at', 'updated_at']
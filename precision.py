@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import contextlib
+from dataclasses import dataclass
+
+import torch
+
+from settings import CPU_NUM_THREADS, PRECISION_POLICY
+
+
+@dataclass(frozen=True)
+class PrecisionPolicy:
+    """How the UNet, ControlNet and VAE are stored and run."""
+
+    name: str
+    dtype: torch.dtype
+    device: str
+    autocast_dtype: torch.dtype | None = None
+    channels_last: bool = False
+    attention_slicing: bool = False
+    num_threads: int | None = None
+
+    def autocast(self):
+        if self.autocast_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(torch.device(self.device).type, dtype=self.autocast_dtype)
+
+    def apply(self, pipe) -> None:
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        if self.channels_last:
+            for module in (pipe.unet, pipe.controlnet, pipe.vae):
+                module.to(memory_format=torch.channels_last)
+        if self.attention_slicing:
+            pipe.enable_attention_slicing()
+        elif torch.device(self.device).type == "cuda":
+            pipe.enable_xformers_memory_efficient_attention()
+
+
+def _accelerator() -> str | None:
+    if torch.cuda.is_available():
+        return "cuda:0"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return None
+
+
+def get_policy(name: str | None = None) -> PrecisionPolicy:
+    """Returns the named policy: fp32, bf16-cpu, fp16 or auto (fp16 on an accelerator, else fp32)."""
+    name = name or PRECISION_POLICY
+    accelerator = _accelerator()
+    if name == "auto":
+        name = "fp16" if accelerator else "fp32"
+    if name == "fp32":
+        return PrecisionPolicy(
+            name=name,
+            dtype=torch.float32,
+            device=accelerator or "cpu",
+            num_threads=CPU_NUM_THREADS if accelerator is None else None,
+        )
+    if name == "bf16-cpu":
+        # Weights stay fp32; matmuls and convolutions run in bf16 under CPU autocast.
+        return PrecisionPolicy(
+            name=name,
+            dtype=torch.float32,
+            device="cpu",
+            autocast_dtype=torch.bfloat16,
+            channels_last=True,
+            num_threads=CPU_NUM_THREADS,
+        )
+    if name == "fp16":
+        if accelerator is None:
+            raise ValueError("The fp16 policy needs a CUDA or MPS device.")
+        return PrecisionPolicy(
+            name=name,
+            dtype=torch.float16,
+            device=accelerator,
+            channels_last=True,
+            attention_slicing=accelerator == "mps",
+        )
+    raise ValueError(f"Unknown precision policy {name}.")
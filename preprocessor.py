@@ -1,8 +1,8 @@
-import gc
+import threading
+from collections import OrderedDict
 
 import numpy as np
 import PIL.Image
-import torch
 from controlnet_aux import (
     CannyDetector,
     ContentShuffleDetector,
@@ -20,49 +20,126 @@ from controlnet_aux.util import HWC3
 from cv_utils import resize_image
 from depth_estimator import DepthEstimator
 from image_segmentor import ImageSegmentor
+from model_manager import FOOTPRINTS, model_manager
+from settings import PREPROCESSOR_CAPACITY, PREPROCESSOR_PRELOAD
 
 
 class Preprocessor:
+    """
+    Runs ControlNet annotators, keeping up to capacity of them loaded in an LRU keyed by
+    name so that switching between control types does not reload weights.
+
+    Annotators with weights are held by model_manager under its memory budget, which may
+    evict them between requests; the LRU then only remembers their names.
+    """
+
     MODEL_ID = "lllyasviel/Annotators"
+    # Annotators whose __call__ accepts a list of images.
+    BATCHED = ("DPT", "UPerNet")
+    # Annotators without weights, kept here rather than in model_manager.
+    WEIGHTLESS = ("Canny", "ContentShuffle")
 
-    def __init__(self):
+    def __init__(self, capacity: int = PREPROCESSOR_CAPACITY, preload=PREPROCESSOR_PRELOAD):
+        self.capacity = max(1, capacity)
+        self.models = OrderedDict()  # name -> annotator (None if held by model_manager), LRU first
         self.model = None
         self.name = ""
+        self.loads = {}
+        self.hits = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.preload(preload)
 
-    def load(self, name: str) -> None:
-        if name == self.name:
-            return
+    def _create(self, name: str):
         if name == "HED":
-            self.model = HEDdetector.from_pretrained(self.MODEL_ID)
+            return HEDdetector.from_pretrained(self.MODEL_ID)
         elif name == "Midas":
-            self.model = MidasDetector.from_pretrained(self.MODEL_ID)
+            return MidasDetector.from_pretrained(self.MODEL_ID)
         elif name == "MLSD":
-            self.model = MLSDdetector.from_pretrained(self.MODEL_ID)
+            return MLSDdetector.from_pretrained(self.MODEL_ID)
         elif name == "Openpose":
-            self.model = OpenposeDetector.from_pretrained(self.MODEL_ID)
+            return OpenposeDetector.from_pretrained(self.MODEL_ID)
         elif name == "PidiNet":
-            self.model = PidiNetDetector.from_pretrained(self.MODEL_ID)
+            return PidiNetDetector.from_pretrained(self.MODEL_ID)
         elif name == "NormalBae":
-            self.model = NormalBaeDetector.from_pretrained(self.MODEL_ID)
+            return NormalBaeDetector.from_pretrained(self.MODEL_ID)
         elif name == "Lineart":
-            self.model = LineartDetector.from_pretrained(self.MODEL_ID)
+            return LineartDetector.from_pretrained(self.MODEL_ID)
         elif name == "LineartAnime":
-            self.model = LineartAnimeDetector.from_pretrained(self.MODEL_ID)
+            return LineartAnimeDetector.from_pretrained(self.MODEL_ID)
         elif name == "Canny":
-            self.model = CannyDetector()
+            return CannyDetector()
         elif name == "ContentShuffle":
-            self.model = ContentShuffleDetector()
+            return ContentShuffleDetector()
         elif name == "DPT":
-            self.model = DepthEstimator()
+            return DepthEstimator()
         elif name == "UPerNet":
-            self.model = ImageSegmentor()
+            return ImageSegmentor()
         else:
-            raise ValueError
-        torch.cuda.empty_cache()
-        gc.collect()
-        self.name = name
+            raise ValueError(f"Unknown preprocessor: {name}")
+
+    @staticmethod
+    def _manager_name(name: str) -> str:
+        return "annotator:" + name
+
+    def _get(self, name: str):
+        if name in self.WEIGHTLESS:
+            return self._create(name)
+        return model_manager.get(self._manager_name(name), lambda: self._create(name), footprint=FOOTPRINTS["annotator"])
+
+    def load(self, name: str) -> None:
+        with self._lock:
+            if name in self.models:
+                self.models.move_to_end(name)
+                model = self.models[name]
+                if model is None:
+                    # The model manager may have evicted it to make room for another model.
+                    if model_manager.peek(self._manager_name(name)) is None:
+                        self.loads[name] = self.loads.get(name, 0) + 1
+                    else:
+                        self.hits += 1
+                    model = self._get(name)
+                else:
+                    self.hits += 1
+            else:
+                model = self._get(name)
+                self.models[name] = model if name in self.WEIGHTLESS else None
+                self.loads[name] = self.loads.get(name, 0) + 1
+                if len(self.models) > self.capacity:
+                    evicted, _ = self.models.popitem(last=False)
+                    self.evictions += 1
+                    print(f"Unloaded preprocessor {evicted} to load {name}")
+                    if evicted not in self.WEIGHTLESS:
+                        model_manager.unload(self._manager_name(evicted))
+            self.model = model
+            self.name = name
+
+    def preload(self, names) -> None:
+        """Loads the given annotators ahead of the first request; the last one becomes current."""
+        for name in names:
+            self.load(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total_loads = sum(self.loads.values())
+            return {
+                "capacity": self.capacity,
+                "loaded": list(reversed(self.models)),
+                "hits": self.hits,
+                "loads": dict(self.loads),
+                "evictions": self.evictions,
+                "hit_rate": self.hits / (self.hits + total_loads) if self.hits + total_loads else 0.0,
+            }
 
-    def __call__(self, image: PIL.Image.Image, **kwargs) -> PIL.Image.Image:
+    def __call__(self, image, **kwargs):
+        """
+        Runs the current annotator on an image, or on a list of images. DPT and UPerNet
+        take the whole list in batched forward passes; the others run image by image.
+        """
+        if isinstance(image, list):
+            if self.name in self.BATCHED:
+                return self.model(image, **kwargs)
+            return [self(img, **dict(kwargs)) for img in image]
         if self.name == "Canny":
             if "detect_resolution" in kwargs:
                 detect_resolution = kwargs.pop("detect_resolution")
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from settings import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def brand_fields(instance, exclude=('id', 'created_at')):
+    """Returns the BrandCreation fields that affect the poster, with whitespace normalised."""
+    return {
+        field.name: _normalize(getattr(instance, field.name))
+        for field in instance._meta.concrete_fields
+        if field.name not in exclude
+    }
+
+
+def result_key(instance, template, seed, params):
+    """
+    Hashes everything that determines the finished poster. template should identify the
+    template file's contents, e.g. its name plus size and mtime.
+    """
+    payload = {'brand': brand_fields(instance), 'template': template, 'seed': seed, 'params': params}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk store of finished posters keyed by result_key, evicting the least recently
+    used entries once the total size goes over max_bytes.
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if os.path.isdir(cache_dir):
+            files = [f for f in os.listdir(cache_dir) if f.endswith('.png')]
+            files.sort(key=lambda f: os.path.getmtime(os.path.join(cache_dir, f)))
+            for file in files:
+                size = os.path.getsize(os.path.join(cache_dir, file))
+                self._entries[file[:-4]] = size
+                self.bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.png')
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            image = Image.open(path)
+            image.load()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.bytes -= self._entries.pop(key, 0)
+            return None
+        return image
+
+    def put(self, key, image):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # A unique temp file per writer: repeat requests for one key often finish together.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, format='PNG')
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        size = os.path.getsize(path)
+        with self._lock:
+            self.bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self.bytes -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+            }
+
+
+result_cache = ResultCache()
@@ -13,3 +13,62 @@ ALLOW_CHANGING_BASE_MODEL = os.getenv("SPACE_ID") != "hysts/ControlNet-v1-1"
 SHOW_DUPLICATE_BUTTON = os.getenv("SHOW_DUPLICATE_BUTTON") == "1"
 
 MAX_SEED = np.iinfo(np.int32).max
+
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "16"))
+GENERATED_IMAGE_DIR = os.getenv("GENERATED_IMAGE_DIR", "generated")
+# Results in GENERATED_IMAGE_DIR are deleted after this many seconds.
+GENERATED_IMAGE_TTL = float(os.getenv("GENERATED_IMAGE_TTL", str(7 * 24 * 60 * 60)))
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "4"))
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "50"))
+
+PRECISION_POLICY = os.getenv("PRECISION_POLICY", "auto")
+CPU_NUM_THREADS = int(os.getenv("CPU_NUM_THREADS", "0")) or None
+
+CLIP_CACHE_DIR = os.getenv("CLIP_CACHE_DIR", ".clip_cache")
+CLIP_BATCH_SIZE = int(os.getenv("CLIP_BATCH_SIZE", "32"))
+
+TEXT_EMBEDDING_CACHE_SIZE = int(os.getenv("TEXT_EMBEDDING_CACHE_SIZE", "1024"))
+TOPK_CACHE_SIZE = int(os.getenv("TOPK_CACHE_SIZE", "256"))
+
+TEMPLATE_DIR = os.getenv("TEMPLATE_DIR", "templates")
+TEMPLATE_ANALYSIS_DIR = os.getenv("TEMPLATE_ANALYSIS_DIR", ".template_analysis")
+
+OCR_WORKING_SIZE = int(os.getenv("OCR_WORKING_SIZE", "1024"))
+
+FONT_DIR = os.getenv("FONT_DIR", "fonts")
+DEFAULT_FONT = os.getenv("DEFAULT_FONT", "arial.ttf")
+
+LOGO_CACHE_DIR = os.getenv("LOGO_CACHE_DIR", ".logo_cache")
+LOGO_CONNECT_TIMEOUT = float(os.getenv("LOGO_CONNECT_TIMEOUT", "3"))
+LOGO_READ_TIMEOUT = float(os.getenv("LOGO_READ_TIMEOUT", "10"))
+LOGO_MAX_BYTES = int(os.getenv("LOGO_MAX_BYTES", str(10 * 1024 * 1024)))
+LOGO_MEMORY_ENTRIES = int(os.getenv("LOGO_MEMORY_ENTRIES", "64"))
+LOGO_MEMORY_TTL = float(os.getenv("LOGO_MEMORY_TTL", "300"))
+
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "6"))
+
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", "6"))
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "90"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "90"))
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", ".result_cache")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "160"))
+OLLAMA_UNLOAD_MEMORY_PERCENT = float(os.getenv("OLLAMA_UNLOAD_MEMORY_PERCENT", "85"))
+COPY_CACHE_ENTRIES = int(os.getenv("COPY_CACHE_ENTRIES", "512"))
+COPY_CACHE_TTL = float(os.getenv("COPY_CACHE_TTL", str(24 * 60 * 60)))
+
+# Memory budgets for resident models; 0 picks 60% of RAM and 90% of the first GPU.
+MODEL_RAM_BUDGET_MB = int(os.getenv("MODEL_RAM_BUDGET_MB", "0"))
+MODEL_VRAM_BUDGET_MB = int(os.getenv("MODEL_VRAM_BUDGET_MB", "0"))
+
+PREPROCESSOR_CAPACITY = int(os.getenv("PREPROCESSOR_CAPACITY", "3"))
+PREPROCESSOR_PRELOAD = [name for name in os.getenv("PREPROCESSOR_PRELOAD", "Canny").split(",") if name]
+
+CONTROL_CACHE_MAX_BYTES = int(os.getenv("CONTROL_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CONTROL_CACHE_WARMUP = os.getenv("CONTROL_CACHE_WARMUP", "1") == "1"
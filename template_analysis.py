@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+
+from PIL import Image
+
+from image_utils import remove_text_with_easyocr_batch
+from lru import LRUCache
+from settings import TEMPLATE_ANALYSIS_DIR, TEMPLATE_DIR
+from yolo_prediction import get_detector
+
+
+class TemplateAnalysis:
+    """Everything the request path needs from a template that does not depend on the brand."""
+
+    def __init__(self, name, boxes, image, stamp=None):
+        self.name = name
+        self.boxes = boxes  # class name -> list of (x1, y1, x2, y2)
+        self.image = image  # text-free template
+        self.size = image.size
+        self.stamp = stamp  # template file size and mtime the analysis was built from
+
+
+class TemplateAnalysisStore:
+    """
+    Stores, per file in the template folder, the YOLO class->bbox map and the cleaned
+    text-free image. Entries are keyed by file size and mtime and rebuilt when stale.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, cache_dir=TEMPLATE_ANALYSIS_DIR, max_loaded=16):
+        self.template_dir = template_dir
+        self.cache_dir = cache_dir
+        self._loaded = LRUCache(maxsize=max_loaded)
+        self._lock = threading.Lock()
+        self._name_locks = {}
+        # YOLO and EasyOCR are shared models; one analysis runs at a time.
+        self._detect_lock = threading.Lock()
+
+    def _paths(self, name):
+        stem = os.path.splitext(name)[0]
+        return os.path.join(self.cache_dir, stem + '.json'), os.path.join(self.cache_dir, stem + '.png')
+
+    def stamp(self, name):
+        """Size and mtime of the template file; artifacts built from another stamp are stale."""
+        stat = os.stat(os.path.join(self.template_dir, name))
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def template_names(self):
+        return sorted(f for f in os.listdir(self.template_dir) if f.endswith(('.png', '.jpg', '.jpeg')))
+
+    def is_stale(self, name):
+        meta_path, image_path = self._paths(name)
+        if not (os.path.isfile(meta_path) and os.path.isfile(image_path)):
+            return True
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return meta.get('stamp') != self.stamp(name)
+
+    def analyze(self, name):
+        """Runs detection and text removal for one template and writes the artifacts."""
+        return self.analyze_batch([name])[0]
+
+    def analyze_batch(self, names):
+        """Runs one batched detection and one batched text removal over several templates."""
+        images = [Image.open(os.path.join(self.template_dir, name)).convert('RGB') for name in names]
+        with self._detect_lock:
+            detections = get_detector().predict(images)
+            cleaned = remove_text_with_easyocr_batch([empty_template for _, empty_template in detections])
+        return [self._store(name, boxes, image) for name, (boxes, _), image in zip(names, detections, cleaned)]
+
+    def _store(self, name, boxes, image):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta_path, image_path = self._paths(name)
+        image.save(image_path + '.tmp', format='PNG')
+        os.replace(image_path + '.tmp', image_path)
+        stamp = self.stamp(name)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({'stamp': stamp, 'boxes': boxes, 'width': image.width, 'height': image.height}, f)
+        os.replace(meta_path + '.tmp', meta_path)
+        analysis = TemplateAnalysis(name, boxes, image, stamp)
+        self._loaded.put(name, analysis)
+        return analysis
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._name_locks.setdefault(name, threading.Lock())
+
+    def get(self, template_path):
+        """
+        Returns the analysis for a template, computing it only if it is missing or stale.
+        The returned image is a copy, so callers may paste onto it.
+        """
+        name = os.path.basename(template_path)
+        analysis = self._loaded.get(name)
+        # A hit only costs a stat; templates are locked one by one, so analysing a stale
+        # template does not hold up lookups of the others.
+        if analysis is None or analysis.stamp != self.stamp(name):
+            with self._name_lock(name):
+                analysis = self._loaded.get(name)
+                if analysis is None or analysis.stamp != self.stamp(name):
+                    if self.is_stale(name):
+                        analysis = self.analyze(name)
+                    else:
+                        meta_path, image_path = self._paths(name)
+                        with open(meta_path) as f:
+                            meta = json.load(f)
+                        image = Image.open(image_path)
+                        image.load()
+                        analysis = TemplateAnalysis(name, meta['boxes'], image, meta['stamp'])
+                        self._loaded.put(name, analysis)
+        return TemplateAnalysis(name, analysis.boxes, analysis.image.copy(), analysis.stamp)
+
+    def rebuild(self, force=False, batch_size=8):
+        """Rebuilds stale (or, with force, all) entries and drops artifacts of deleted templates."""
+        names = self.template_names()
+        rebuilt = [name for name in names if force or self.is_stale(name)]
+        for start in range(0, len(rebuilt), batch_size):
+            batch = rebuilt[start:start + batch_size]
+            print(f"Analyzing {', '.join(batch)}")
+            self.analyze_batch(batch)
+        if os.path.isdir(self.cache_dir):
+            stems = {os.path.splitext(name)[0] for name in names}
+            for file in os.listdir(self.cache_dir):
+                if os.path.splitext(file)[0] not in stems:
+                    os.remove(os.path.join(self.cache_dir, file))
+        return rebuilt
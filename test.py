@@ -1,5 +1,4 @@
 import requests
-import base64
 
 def send_data_and_save_image():
     url = "http://127.0.0.1:8000/create/"
@@ -37,23 +36,16 @@ def send_data_and_save_image():
     }
 
     try:
-        # Send the POST request
-        response = requests.post(url, json=data)
+        # Send the POST request, asking for the raw PNG instead of base64 JSON
+        response = requests.post(url, json=data, headers={"Accept": "image/png"})
 
         # Check for successful response
         response.raise_for_status()
 
-        # Assuming the response contains a base64 encoded image
-        result = response.json()
-        base64_image = result.get("generated_image")  # Change based on actual response structure
-
-        if base64_image:
-            # Decode the base64 string
-            image_data = base64.b64decode(base64_image)
-
+        if response.headers.get("Content-Type", "").startswith("image/"):
             # Save the image
             with open("generated_image.png", "wb") as image_file:
-                image_file.write(image_data)
+                image_file.write(response.content)
             print("Image saved as generated_image.png")
         else:
             print("No image found in the response.")
@@ -0,0 +1,144 @@
+import gc
+import threading
+import time
+import unittest
+import weakref
+
+from batching import BatchScheduler, BatchSchedulerClosed, expand_items, image_seeds, split_results
+
+
+def render(item, seed):
+    """Stands in for one image of the pipeline: deterministic in the prompt and seed."""
+    return f"{item['prompt']}@{seed}"
+
+
+class FakeModel:
+    """Mirrors Model._run_batch without torch: one call per image, or one batched call."""
+
+    def __init__(self, max_batch_size=4, max_wait_ms=50):
+        self.calls = []
+        self.batcher = BatchScheduler(self.run_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    def run_batch(self, key, items):
+        self.calls.append((key, [item['prompt'] for item in items]))
+        if len(items) == 1:
+            item = items[0]
+            return [[render(item, seed) for seed in image_seeds(item['seed'], item['num_images'])]]
+        return split_results(items, [render(item, seed) for item, seed in expand_items(items)])
+
+
+def item(prompt, seed=0, num_images=1):
+    return {'prompt': prompt, 'seed': seed, 'num_images': num_images}
+
+
+class BatchSchedulerTests(unittest.TestCase):
+    def test_groups_requests_by_key(self):
+        model = FakeModel(max_batch_size=4, max_wait_ms=100)
+        futures = [
+            model.batcher.submit('a', item('a1')),
+            model.batcher.submit('b', item('b1')),
+            model.batcher.submit('a', item('a2')),
+        ]
+        results = [future.result(timeout=2) for future in futures]
+        self.assertEqual([batch_size for _, batch_size in results], [2, 1, 2])
+        self.assertEqual(sorted(model.calls), [('a', ['a1', 'a2']), ('b', ['b1'])])
+        model.batcher.close()
+
+    def test_flushes_when_batch_is_full(self):
+        model = FakeModel(max_batch_size=2, max_wait_ms=10_000)
+        start = time.monotonic()
+        futures = [model.batcher.submit('k', item(f'p{i}')) for i in range(2)]
+        for future in futures:
+            self.assertEqual(future.result(timeout=2)[1], 2)
+        self.assertLess(time.monotonic() - start, 2)
+        model.batcher.close()
+
+    def test_flushes_when_window_expires(self):
+        model = FakeModel(max_batch_size=8, max_wait_ms=50)
+        start = time.monotonic()
+        result, batch_size = model.batcher.submit('k', item('p')).result(timeout=2)
+        self.assertEqual((result, batch_size), (['p@0'], 1))
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        model.batcher.close()
+
+    def test_failure_reaches_every_request_of_the_batch(self):
+        def run_batch(key, items):
+            raise ValueError('boom')
+
+        batcher = BatchScheduler(run_batch, max_batch_size=2, max_wait_ms=1000)
+        futures = [batcher.submit('k', item(f'p{i}')) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(timeout=2)
+        batcher.close()
+
+    def test_close_runs_pending_requests_and_refuses_new_ones(self):
+        model = FakeModel(max_batch_size=8, max_wait_ms=10_000)
+        futures = [model.batcher.submit('k', item(f'p{i}')) for i in range(3)]
+        # Closing inside the wait window, as an eviction would, still runs the queued requests.
+        model.batcher.close()
+        results = [future.result(timeout=2) for future in futures]
+        self.assertEqual(results, [(['p0@0'], 3), (['p1@0'], 3), (['p2@0'], 3)])
+        with self.assertRaises(BatchSchedulerClosed):
+            model.batcher.submit('k', item('late'))
+        model.batcher._worker.join(timeout=2)
+        self.assertFalse(model.batcher._worker.is_alive())
+
+    def test_worker_does_not_keep_an_evicted_owner_alive(self):
+        model = FakeModel(max_batch_size=4, max_wait_ms=10)
+        model.batcher.submit('k', item('p')).result(timeout=2)
+        batcher = model.batcher
+        ref = weakref.ref(model)
+        del model
+        gc.collect()
+        self.assertIsNone(ref())
+        batcher.close()
+        batcher._worker.join(timeout=2)
+        self.assertFalse(batcher._worker.is_alive())
+
+    def test_concurrent_submits_during_close_either_run_or_are_refused(self):
+        model = FakeModel(max_batch_size=4, max_wait_ms=20)
+        outcomes = []
+
+        def client(i):
+            try:
+                outcomes.append(model.batcher.submit('k', item(f'p{i}')).result(timeout=2)[0])
+            except BatchSchedulerClosed:
+                # What process_canny does: run the request unbatched.
+                outcomes.append(model.run_batch('k', [item(f'p{i}')])[0])
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(8)]
+        for thread in threads[:4]:
+            thread.start()
+        model.batcher.close()
+        for thread in threads[4:]:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=2)
+        self.assertEqual(sorted(outcomes), sorted([[f'p{i}@0'] for i in range(8)]))
+
+
+class SeedParityTests(unittest.TestCase):
+    def test_image_seeds_count_up_from_the_request_seed(self):
+        self.assertEqual(image_seeds(7, 3), [7, 8, 9])
+
+    def test_batched_and_unbatched_requests_get_the_same_images(self):
+        items = [item('a', seed=10, num_images=2), item('b', seed=10, num_images=1), item('c', seed=3, num_images=3)]
+        model = FakeModel()
+        unbatched = [model.run_batch('k', [entry])[0] for entry in items]
+        batched = model.run_batch('k', items)
+        self.assertEqual(batched, unbatched)
+        model.batcher.close()
+
+    def test_scheduler_results_match_direct_runs(self):
+        items = [item('a', seed=1, num_images=2), item('b', seed=5, num_images=1)]
+        model = FakeModel(max_batch_size=2, max_wait_ms=1000)
+        futures = [model.batcher.submit('k', entry) for entry in items]
+        results = [future.result(timeout=2)[0] for future in futures]
+        self.assertEqual(results, [['a@1', 'a@2'], ['b@5']])
+        self.assertEqual(results, [model.run_batch('k', [entry])[0] for entry in items])
+        model.batcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
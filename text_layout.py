@@ -0,0 +1,110 @@
+from functools import lru_cache
+
+from PIL import ImageFont
+
+
+@lru_cache(maxsize=256)
+def load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Loads a TrueType font once per (path, size), falling back to Pillow's default font."""
+    try:
+        return ImageFont.truetype(font_path, size)
+    except IOError:
+        return ImageFont.load_default(size)
+
+
+class TextLayout:
+    """
+    Result of fitting text into a bounding box: the wrapped lines, the top-left
+    position and height of each line, and the chosen font.
+    """
+
+    def __init__(self, lines, positions, heights, font, font_size):
+        self.lines = lines
+        self.positions = positions
+        self.heights = heights
+        self.font = font
+        self.font_size = font_size
+
+
+def _wrap(words, font, max_width):
+    """Greedily wraps words into lines no wider than max_width, measuring each word once."""
+    space = font.getlength(' ')
+    widths = {word: font.getlength(word) for word in set(words)}
+    lines, current, current_width = [], [], 0.0
+    for word in words:
+        width = widths[word] if not current else current_width + space + widths[word]
+        if width <= max_width or not current:
+            current.append(word)
+            current_width = width
+        else:
+            lines.append(' '.join(current))
+            current, current_width = [word], widths[word]
+    lines.append(' '.join(current))
+    return lines
+
+
+def _line_heights(lines, font):
+    heights = []
+    for line in lines:
+        box = font.getbbox(line)
+        heights.append(box[3] - box[1])
+    return heights
+
+
+def layout_text(text: str, bbox: tuple, font_path: str = "arial.ttf", align: str = "left",
+                fill_ratio: float = 0.9, line_spacing: int = 5, font_loader=None) -> TextLayout:
+    """
+    Fits text into a bounding box by binary-searching the largest font size (up to half the
+    box height) whose wrapped lines fit inside fill_ratio of the box.
+
+    Args:
+        text (str): The text to lay out.
+        bbox (tuple): The bounding box as (left, upper, right, lower).
+        font_path (str): The path to the TTF font file to be used.
+        align (str): "left" or "center".
+        fill_ratio (float): Fraction of the box width and height the text may use.
+        line_spacing (int): Extra pixels between lines.
+        font_loader (callable): Optional size -> FreeTypeFont loader; defaults to load_font(font_path, size).
+
+    Returns:
+        TextLayout: The lines, their positions and the chosen font.
+    """
+    if font_loader is None:
+        def font_loader(size):
+            return load_font(font_path, size)
+    left, upper, right, lower = bbox
+    box_width = int((right - left) * fill_ratio)
+    box_height = int((lower - upper) * fill_ratio)
+    words = text.split()
+
+    def fit(size):
+        candidate = font_loader(size)
+        lines = _wrap(words, candidate, box_width)
+        heights = _line_heights(lines, candidate)
+        return sum(heights) <= box_height, lines, heights, candidate
+
+    low, high = 1, max(1, box_height // 2)
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        fits, lines, heights, candidate = fit(size)
+        if fits:
+            best = (size, lines, heights, candidate)
+            low = size + 1
+        else:
+            high = size - 1
+    if best is None:
+        _, lines, heights, candidate = fit(1)
+        best = (1, lines, heights, candidate)
+    font_size, lines, heights, chosen = best
+
+    positions = []
+    y = upper + (box_height - sum(heights)) / 2
+    for line, height in zip(lines, heights):
+        if align == "center":
+            x = left + (box_width - chosen.getlength(line)) / 2
+        else:
+            x = left
+        positions.append((x, y))
+        y += height + line_spacing
+    return TextLayout(lines, positions, heights, chosen, font_size)
@@ -4,6 +4,7 @@ import cv2
 from ultralytics import YOLO
 from PIL import Image
 from inpaint import resize_image_aspect_ratio,inpaint_image
+from model_manager import FOOTPRINTS, default_device, model_manager
 from PIL import Image, ImageDraw
 import cv2
 import numpy as np
@@ -65,30 +66,51 @@ def predict_and_display_masks(bounding_boxes,original_image):
 
     
     
-# Load the model
-def getBoxes(image_path):
-    original_image=cv2.imread(image_path)
-    model = YOLO("best.pt")
-    results = model.predict(image_path, conf=0.2)
-    detections = results[0]
-    extracted_masks=results[0].masks.data
-    bounding_boxes = {}
-    boxes = detections.boxes
-    class_ids = boxes.cls.tolist()  # Class IDs
-    # Loop through boxes again to build the dictionary
-    for i in range(len(boxes.xyxy)):
-        class_id = int(class_ids[i])
-        class_name = detections.names[class_id]  # Get class name from class ID
-        # Store bounding box in the dictionary
-        if class_name not in bounding_boxes:
-            bounding_boxes[class_name] = []
-  
-        bounding_boxes[class_name].append((boxes.xyxy[i][0].item(), boxes.xyxy[i][1].item(), boxes.xyxy[i][2].item(), boxes.xyxy[i][3].item()))
-    masked_image=predict_and_display_masks(bounding_boxes=bounding_boxes,original_image=original_image)
-    Image.fromarray(masked_image).show()
-    inpainted_image=inpaint_image(original_image=original_image,mask_image=masked_image)
-    Image.fromarray(detections.plot()).show()
-    return bounding_boxes,inpainted_image
-
+class BoxDetector:
+    """
+    Loads the YOLO weights once and detects poster elements in in-memory images.
 
+    Images may be PIL images (RGB) or NumPy arrays in OpenCV's BGR order.
+    """
 
+    def __init__(self, weights="best.pt", conf=0.2):
+        self.model = YOLO(weights)
+        self.conf = conf
+
+    @staticmethod
+    def _to_bgr(image):
+        if isinstance(image, Image.Image):
+            return cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+        return image
+
+    def predict(self, images):
+        """
+        Runs one batched prediction and returns, per image, the class name -> boxes map
+        and the image with the detected regions inpainted.
+        """
+        originals = [self._to_bgr(image) for image in images]
+        results = self.model.predict(originals, conf=self.conf, verbose=False)
+        outputs = []
+        for original_image, detections in zip(originals, results):
+            bounding_boxes = {}
+            boxes = detections.boxes
+            class_ids = boxes.cls.tolist()  # Class IDs
+            for i in range(len(boxes.xyxy)):
+                class_name = detections.names[int(class_ids[i])]  # Get class name from class ID
+                bounding_boxes.setdefault(class_name, []).append(tuple(boxes.xyxy[i].tolist()))
+            masked_image=predict_and_display_masks(bounding_boxes=bounding_boxes,original_image=original_image)
+            inpainted_image=inpaint_image(original_image=original_image,mask_image=masked_image)
+            outputs.append((bounding_boxes, inpainted_image))
+        return outputs
+
+
+def get_detector():
+    """Returns the process-wide BoxDetector, loading the weights on first use."""
+    return model_manager.get('yolo', BoxDetector, device=default_device(), footprint=FOOTPRINTS['yolo'])
+
+
+def getBoxes(image):
+    """Detects boxes in an image path, PIL image or BGR array; returns (boxes, inpainted BGR image)."""
+    if isinstance(image, str):
+        image = cv2.imread(image)
+    return get_detector().predict([image])[0]
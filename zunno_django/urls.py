@@ -16,9 +16,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from parameters.views import BrandCreationAPIView
+from parameters.views import BrandCreationAPIView, CacheStatsAPIView, JobResultAPIView, JobStatusAPIView, ModelStatsAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('create/', BrandCreationAPIView.as_view()),
+    path('jobs/<uuid:job_id>/', JobStatusAPIView.as_view()),
+    path('jobs/<uuid:job_id>/result/', JobResultAPIView.as_view()),
+    path('stats/models/', ModelStatsAPIView.as_view()),
+    path('stats/caches/', CacheStatsAPIView.as_view()),
 ]
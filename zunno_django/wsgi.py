@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zunno_django.settings')
 
 application = get_wsgi_application()
+
+# Each server process fails the jobs left behind by processes that have exited.
+from django.db import DatabaseError
+
+from parameters.job_maintenance import recover_interrupted_jobs
+
+try:
+    recover_interrupted_jobs()
+except DatabaseError as e:
+    # The jobs table does not exist until migrations have run.
+    print(f"Skipped generation job recovery: {e}")